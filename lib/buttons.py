@@ -0,0 +1,125 @@
+# Button events on top of the debounced inputs.
+#
+# RepeatButton turns the level of a push button into press, repeat and
+# release events, polled from the UI loop without sleeping. While the
+# button is held, repeats start after delay_ms and come faster and faster,
+# each interval being ramp_pct % of the previous one, down to fastest_ms.
+#
+# SelectSwitch reports click, double click and long press of a switch from
+# the timestamped edges of edge_ring.EdgeInputs, so that the UI reacts
+# when the switch is released, without sleeping to avoid double triggers.
+#
+#   up = RepeatButton(debouncer, 'Up')
+#   if up.step(): value += 1
+#
+#   select = SelectSwitch(rotary_sw.sw_pin())
+#   if select.event() == CLICK: ...
+
+from micropython import const
+from utime import ticks_ms, ticks_us, ticks_add, ticks_diff
+
+from edge_ring import EdgeInputs
+
+# Events
+PRESS = const(1)
+REPEAT = const(2)
+RELEASE = const(3)
+CLICK = const(4)
+DOUBLE_CLICK = const(5)
+LONG_PRESS = const(6)
+
+
+class RepeatButton:
+
+    def __init__(self, inputs, name, delay_ms=300, fastest_ms=20, ramp_pct=75):
+        # inputs is anything with value(name), such as a debouncer.Debouncer
+        self.inputs = inputs
+        self.name = name
+        self.delay_ms = delay_ms
+        self.fastest_ms = fastest_ms
+        self.ramp_pct = ramp_pct
+        self.held = False
+        self.interval = delay_ms
+        self.next_ms = 0
+
+    def event(self):
+        """PRESS, REPEAT, RELEASE or None."""
+        now = ticks_ms()
+        if self.inputs.value(self.name):
+            if not self.held:
+                self.held = True
+                self.interval = self.delay_ms
+                self.next_ms = ticks_add(now, self.interval)
+                return PRESS
+            if ticks_diff(now, self.next_ms) >= 0:
+                self.interval = max(self.fastest_ms,
+                                    self.interval * self.ramp_pct // 100)
+                self.next_ms = ticks_add(now, self.interval)
+                return REPEAT
+        elif self.held:
+            self.held = False
+            return RELEASE
+        return None
+
+    def step(self):
+        """1 if the button was just pressed or repeats now, else 0."""
+        event = self.event()
+        return 1 if event == PRESS or event == REPEAT else 0
+
+
+############### END OF CLASS ################
+
+
+class SelectSwitch:
+
+    # A click is reported double_ms after its release, unless a second click
+    # follows and makes a DOUBLE_CLICK; with double_ms=0 clicks are reported
+    # at release. Held for long_ms, the switch gives a LONG_PRESS at once
+    # and its release is not a click.
+
+    def __init__(self, pin, window_ms=10, double_ms=250, long_ms=1000):
+        self.inputs = EdgeInputs({'Select': pin}, window_ms, 16)
+        self.inputs.listen_settled(self._settled)
+        self.double_us = double_ms * 1000
+        self.long_us = long_ms * 1000
+        self.reset()
+
+    def reset(self):
+        """Forget the clicks not reported yet."""
+        self.inputs.update()
+        self.held = self.inputs.state[0] == 1
+        self.long_done = self.held      # a switch held now is no click
+        self.down_us = ticks_us()
+        self.up_us = self.down_us
+        self.clicks = 0
+
+    def _settled(self, i, level, ticks):
+        # EdgeInputs listener: the switch changed debounced level at ticks
+        self.held = level == 1
+        if level:
+            self.down_us = ticks
+            self.long_done = False
+        elif not self.long_done:
+            self.clicks += 1
+            self.up_us = ticks
+
+    def event(self):
+        """CLICK, DOUBLE_CLICK, LONG_PRESS or None."""
+        self.inputs.update()
+        now = ticks_us()
+        if self.held and not self.long_done:
+            if ticks_diff(now, self.down_us) >= self.long_us:
+                self.long_done = True
+                self.clicks = 0
+                return LONG_PRESS
+        if self.clicks >= 2:
+            self.clicks = 0
+            return DOUBLE_CLICK
+        if self.clicks and not self.held:
+            if ticks_diff(now, self.up_us) >= self.double_us:
+                self.clicks = 0
+                return CLICK
+        return None
+
+
+############### END OF CLASS ################
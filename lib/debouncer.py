@@ -0,0 +1,183 @@
+# Timer driven integrator debouncer, and a learner that tunes it.
+#
+# Debouncer keeps the single GPIO_IN snapshot per tick of GpioSampler but
+# replaces its fixed 4 tick vertical counter by one integrator per input:
+# a counter that goes up on every high sample and down on every low one,
+# between 0 and the input's limit. The debounced level goes high when the
+# counter reaches the limit and low when it reaches 0, so a level counts
+# once it has been held for the stability time of its input. The limit is
+# stable_ms / period_ms ticks and can be set per input.
+#
+#   debouncer = Debouncer(inPin, stable_ms=2)
+#   timer.init(period=1, mode=Timer.PERIODIC, callback=debouncer.tick)
+#   if debouncer.value('Close'): ...
+#
+# BounceLearner measures how long each input bounces, from the edges
+# captured by edge_ring.EdgeInputs, and sets the stability time of every
+# input to the shortest window that covers its bounces.
+
+import utime
+from array import array
+from machine import disable_irq, enable_irq
+
+from gpio_sampler import GpioSampler
+
+
+class Debouncer(GpioSampler):
+
+    def __init__(self, pins, stable_ms=2, period_ms=1):
+        GpioSampler.__init__(self, pins)
+        self.period_ms = period_ms
+        self.names = list(pins)
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+        self.pin_bits = [self.bits[name] for name in self.names]
+        n = len(self.names)
+        self.limits = bytearray(n)
+        self.counts = bytearray(n)
+        self.set_stable(stable_ms)
+        for i, bit in enumerate(self.pin_bits):
+            if self.state & bit:
+                self.counts[i] = self.limits[i]
+
+    def set_stable(self, stable_ms, name=None):
+        """Set the stability time of input name, or of every input."""
+        ticks = -(-stable_ms // self.period_ms)     # rounded up
+        ticks = min(max(ticks, 1), 255)
+        if name is None:
+            for i in range(len(self.limits)):
+                self._set_limit(i, ticks)
+        else:
+            self._set_limit(self.index[name], ticks)
+
+    def stable_ms(self, name):
+        """Stability time of input name."""
+        return self.limits[self.index[name]] * self.period_ms
+
+    def _set_limit(self, i, ticks):
+        # A count that reaches the new limit has been held long enough: the
+        # input goes high now, tick() only raises it on the way up.
+        irq_state = disable_irq()
+        self.limits[i] = ticks
+        if self.counts[i] >= ticks:
+            self.counts[i] = ticks
+            bit = self.pin_bits[i]
+            if not self.state & bit:
+                self.state |= bit
+                self.rose |= bit
+        enable_irq(irq_state)
+
+    def tick(self, timer=None):
+        """Take a snapshot and advance every integrator; Timer callback."""
+        sample = self.read()
+        counts = self.counts
+        limits = self.limits
+        pin_bits = self.pin_bits
+        state = self.state
+        # range() rather than enumerate(): a hard Timer IRQ can't allocate
+        for i in range(len(pin_bits)):
+            bit = pin_bits[i]
+            count = counts[i]
+            if sample & bit:
+                if count < limits[i]:
+                    count += 1
+                    counts[i] = count
+                    if count == limits[i] and not state & bit:
+                        state |= bit
+                        self.rose |= bit
+            elif count:
+                count -= 1
+                counts[i] = count
+                if not count:
+                    state &= ~bit
+        self.state = state
+
+
+############### END OF CLASS ################
+
+
+MARGIN_PCT = 150            # window = worst bounce of the recent bursts x 1.5
+HISTORY = 8                 # bursts remembered per input
+MIN_BURSTS = 4              # bursts seen before the window is tuned
+
+
+class BounceLearner:
+
+    # Tunes the stability time of each input of a Debouncer from the edges
+    # captured by edge_ring.EdgeInputs. Edges of an input closer than
+    # max_ms to each other form a burst: one press, release or limit
+    # switch actuation with its bounces. The window of an input becomes
+    # 1.5 times the longest of its last HISTORY bursts, within [min_ms,
+    # max_ms]. Bursts that last max_ms or more can't be debounced and are
+    # counted as chatter.
+
+    def __init__(self, inputs, debouncer, min_ms=1, max_ms=30):
+        self.inputs = inputs
+        self.debouncer = debouncer
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.gap_us = max_ms * 1000
+        self.names = inputs.names
+        n = len(self.names)
+        self.first = array('l', [0] * n)        # ticks_us of the burst
+        self.last = array('l', [0] * n)
+        self.edges = array('H', [0] * n)        # edges in the open burst
+        self.bursts = array('L', [0] * n)
+        self.bounced = array('L', [0] * n)      # bursts of more than 1 edge
+        self.chatter = array('L', [0] * n)
+        self.durations = array('l', [0] * (n * HISTORY))
+        self.windows = bytearray(n)             # learned, 0 until tuned
+        inputs.listen(self.edge)
+
+    def edge(self, i, level, ticks):
+        # EdgeInputs listener, called for every edge replayed by update()
+        if self.edges[i] and utime.ticks_diff(ticks, self.last[i]) > self.gap_us:
+            self._close(i)
+        if not self.edges[i]:
+            self.first[i] = ticks
+        self.last[i] = ticks
+        if self.edges[i] < 0xffff:
+            self.edges[i] += 1
+
+    def poll(self, timer=None):
+        """Process the captured edges and close the bursts that ended."""
+        self.inputs.update()
+        now = utime.ticks_us()
+        for i in range(len(self.names)):
+            if self.edges[i] and utime.ticks_diff(now, self.last[i]) > self.gap_us:
+                self._close(i)
+
+    def _close(self, i):
+        duration = utime.ticks_diff(self.last[i], self.first[i])
+        if self.edges[i] > 1:
+            self.bounced[i] += 1
+        if duration >= self.gap_us:
+            self.chatter[i] += 1
+        self.durations[i * HISTORY + self.bursts[i] % HISTORY] = duration
+        self.bursts[i] += 1
+        self.edges[i] = 0
+        if self.bursts[i] >= MIN_BURSTS:
+            count = min(self.bursts[i], HISTORY)
+            worst = max(self.durations[i * HISTORY:i * HISTORY + count])
+            ms = -(-worst * MARGIN_PCT // 100000)   # usec to msec, rounded up
+            self.windows[i] = min(max(ms, self.min_ms), self.max_ms)
+            self.debouncer.set_stable(self.windows[i], self.names[i])
+
+    def apply(self):
+        """Set the learned windows again, after the debouncer was reset."""
+        for i, ms in enumerate(self.windows):
+            if ms:
+                self.debouncer.set_stable(ms, self.names[i])
+
+    def stats(self, name):
+        """Return the learned window and burst counters of input name."""
+        i = self.inputs.index[name]
+        return {
+            'window_ms': self.debouncer.stable_ms(name),
+            'learned': bool(self.windows[i]),
+            'bursts': self.bursts[i],
+            'bounced': self.bounced[i],
+            'chatter': self.chatter[i],
+            }
+
+
+############### END OF CLASS ################
@@ -0,0 +1,183 @@
+# Interrupt driven input capture.
+#
+# EdgeInputs registers a hard IRQ on every input pin. The handler only
+# stores (input, level, ticks_us) in an EdgeRing, preallocated arrays that
+# the IRQ writes and the main loop reads, so nothing is allocated in the
+# interrupt and no edge is lost while the main loop is busy (LCD, sleeps).
+# update() replays the recorded edges through a debounce window: a level
+# counts once it has been held for window_ms, even if it has changed again
+# since. Reading an input is then a lookup, without sampling or sleeping.
+#
+#   inputs = EdgeInputs(Input, window_ms=2)
+#   inputs.on_rise('Stop', stop_signal_handler)
+#   if inputs.value('Close'): ...
+
+import utime
+from array import array
+from machine import Pin
+import micropython
+
+
+class EdgeRing:
+    # Single producer (IRQ), single consumer (main loop) ring of edge
+    # records. The producer only moves head, the consumer only moves tail.
+
+    def __init__(self, size=64):
+        # size must be a power of 2
+        self.mask = size - 1
+        self.inputs = bytearray(size)
+        self.levels = bytearray(size)
+        self.ticks = array('l', [0] * size)
+        self.head = 0
+        self.tail = 0
+        self.lost = 0       # edges dropped because the ring was full
+
+    def push(self, index, level, ticks):
+        # Called from the IRQ; a full ring drops the new edge
+        head = self.head
+        nxt = (head + 1) & self.mask
+        if nxt == self.tail:
+            self.lost += 1
+            return
+        self.inputs[head] = index
+        self.levels[head] = level
+        self.ticks[head] = ticks
+        self.head = nxt
+
+    def __len__(self):
+        return (self.head - self.tail) & self.mask
+
+
+class EdgeInputs:
+
+    def __init__(self, pins, window_ms=2, size=64, burst_ms=None):
+        # pins is a dict of name: Pin, such as main.Input. A rise after
+        # burst_ms without edges starts a new bounce burst for rise_us;
+        # it defaults to window_ms but should cover the longest bounce.
+        self.names = list(pins)
+        self.pins = [pins[name] for name in self.names]
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+        self.ring = EdgeRing(size)
+        self.window_us = window_ms * 1000
+        self.burst_us = (burst_ms or window_ms) * 1000
+        n = len(self.names)
+        self.raw = bytearray(n)         # last level seen in the ring
+        self.since = array('l', [0] * n)  # ticks_us of that edge
+        self.state = bytearray(n)       # debounced level
+        self.latched = bytearray(n)     # debounced 1 not yet read
+        self.rises = array('l', [0] * n)  # ticks_us of the burst's first rise
+        self.edges = array('l', [0] * n)  # ticks_us of the last edge, any level
+        self.rise_handlers = [None] * n
+        self.listeners = []
+        self.settle_listeners = []
+        self.lost = 0
+        self.resync()
+        for i, pin in enumerate(self.pins):
+            pin.irq(handler=self._make_handler(i),
+                    trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING, hard=True)
+
+    def _make_handler(self, i):
+        # One closure per input, built here so that the IRQ allocates nothing
+        ring = self.ring
+        ticks_us = utime.ticks_us
+        ticks_diff = utime.ticks_diff
+        handlers = self.rise_handlers
+        rises = self.rises
+        edges = self.edges
+
+        def handler(pin):
+            level = pin.value()
+            ticks = ticks_us()
+            ring.push(i, level, ticks)
+            # A rise after burst_us without edges starts a burst: the input
+            # was debounced low. The bounces that follow don't move it.
+            if level and ticks_diff(ticks, edges[i]) >= self.burst_us:
+                rises[i] = ticks
+            edges[i] = ticks
+            if level and handlers[i] is not None:
+                try:
+                    micropython.schedule(handlers[i], pin)
+                except RuntimeError:
+                    pass        # schedule queue full
+        return handler
+
+    def on_rise(self, name, handler):
+        """Schedule handler(pin) on every rising edge of input name."""
+        self.rise_handlers[self.index[name]] = handler
+
+    def listen(self, callback):
+        """Have update() call callback(index, level, ticks_us) per edge."""
+        self.listeners.append(callback)
+
+    def listen_settled(self, callback):
+        """Have update() call callback(index, level, ticks_us) when an input
+        changes debounced level, ticks_us being the edge that started it."""
+        self.settle_listeners.append(callback)
+
+    def rise_us(self, name):
+        """ticks_us of the first rising edge of the last burst of input name,
+        taken in the IRQ even if the ring was full."""
+        return self.rises[self.index[name]]
+
+    def resync(self):
+        """Restart from the current pin levels, taken as debounced."""
+        now = utime.ticks_us()
+        for i, pin in enumerate(self.pins):
+            level = pin.value()
+            self.raw[i] = level
+            self.state[i] = level
+            self.since[i] = now
+            self.latched[i] = 0
+
+    def update(self):
+        """Replay the edges recorded since the last call."""
+        ring = self.ring
+        if ring.lost != self.lost:
+            # Edges were dropped, the replay can't be trusted
+            self.lost = ring.lost
+            ring.tail = ring.head
+            self.resync()
+            return
+        window = self.window_us
+        raw = self.raw
+        since = self.since
+        while ring.tail != ring.head:
+            t = ring.tail
+            i = ring.inputs[t]
+            level = ring.levels[t]
+            ticks = ring.ticks[t]
+            ring.tail = (t + 1) & ring.mask
+            for callback in self.listeners:
+                callback(i, level, ticks)
+            if level == raw[i]:
+                continue        # the opposite edge bounced away unseen
+            if utime.ticks_diff(ticks, since[i]) >= window:
+                self._settle(i)
+            raw[i] = level
+            since[i] = ticks
+        now = utime.ticks_us()
+        for i in range(len(raw)):
+            if raw[i] != self.state[i] and utime.ticks_diff(now, since[i]) >= window:
+                self._settle(i)
+
+    def _settle(self, i):
+        # The raw level of input i has been held for the window
+        level = self.raw[i]
+        if level != self.state[i]:
+            self.state[i] = level
+            if level:
+                self.latched[i] = 1
+            for callback in self.settle_listeners:
+                callback(i, level, self.since[i])
+
+    def value(self, name):
+        """Debounced level of input name. A pulse that was held for the
+        window but has ended since the last call still reads 1, once."""
+        self.update()
+        i = self.index[name]
+        level = self.state[i] | self.latched[i]
+        self.latched[i] = 0
+        return level
+
+
+############### END OF CLASS ################
@@ -0,0 +1,78 @@
+# Table driven finite state machine.
+#
+# A machine is a list of transitions (state, event, guard, action, next
+# state), states and events being small integers. The table is compiled
+# once into flat arrays: dispatch() indexes the first transition of
+# (state, event) directly, and only walks on to the next transition of the
+# same pair when a guard fails, in table order. guard and action are
+# callables without arguments, or None.
+#
+#   door = StateMachine(2, 2, (
+#       (CLOSED, EV_OPEN, None, start_opening, OPEN),
+#       (OPEN, EV_CLOSE, is_clear, start_closing, CLOSED),
+#       ))
+#   door.dispatch(EV_OPEN)
+#
+# The state changes after the action has run, so an action still sees the
+# state the transition leaves.
+
+from array import array
+
+
+class StateMachine:
+
+    def __init__(self, num_states, num_events, table, state=0):
+        self.num_events = num_events
+        rows = len(table)
+        self.first = array('h', [-1] * (num_states * num_events))
+        self.alt = array('h', [-1] * rows)     # next row of the same pair
+        self.targets = bytearray(rows)
+        self.guards = [None] * rows
+        self.actions = [None] * rows
+        # Bit mask of the events that have a transition, for each state
+        self.accepts = [0] * num_states
+        last = array('h', [-1] * (num_states * num_events))
+        for row in range(rows):
+            src, event, guard, action, target = table[row]
+            key = src * num_events + event
+            if last[key] < 0:
+                self.first[key] = row
+            else:
+                self.alt[last[key]] = row
+            last[key] = row
+            self.targets[row] = target
+            self.guards[row] = guard
+            self.actions[row] = action
+            self.accepts[src] |= 1 << event
+        self.state = state
+
+    def dispatch(self, event):
+        """Run the transition of event from the current state. Returns False
+        if there is none or if every guard failed."""
+        row = self.first[self.state * self.num_events + event]
+        while row >= 0:
+            guard = self.guards[row]
+            if guard is None or guard():
+                action = self.actions[row]
+                if action is not None:
+                    action()
+                self.state = self.targets[row]
+                return True
+            row = self.alt[row]
+        return False
+
+    def step(self, poll):
+        """Dispatch the first event, in event order, that the current state
+        accepts and poll(event) reports. Events that the state ignores are
+        not polled. Returns True if a transition ran."""
+        accepts = self.accepts[self.state]
+        event = 0
+        while accepts:
+            if accepts & 1 and poll(event) and self.dispatch(event):
+                return True
+            accepts >>= 1
+            event += 1
+        return False
+
+
+############### END OF CLASS ################
@@ -0,0 +1,82 @@
+# CGRAM glyph management for HD44780 character LCDs.
+#
+# The controller has 8 user defined characters, chr(0) to chr(7). GlyphCache
+# remembers which bitmap sits in which slot, uploads a bitmap only when it is
+# not already resident and otherwise replaces the least recently used slot,
+# preferring slots that are not shown anywhere on the display.
+
+FULL_BLOCK = chr(255)   # solid block of the HD44780 character ROM
+
+# Partial blocks with 1 to 4 of the 5 pixel columns filled from the left;
+# the bottom row is left empty for the cursor line.
+BAR_GLYPHS = [bytes([(0x1f << (5 - n)) & 0x1f] * 7 + [0]) for n in range(1, 5)]
+
+
+class GlyphCache:
+
+    def __init__(self, lcd):
+        self.lcd = lcd
+        self.slots = [None] * 8     # bitmap resident in each CGRAM slot
+        self.stamps = [0] * 8       # last use of each slot
+        self.clock = 0
+
+    def char(self, bitmap):
+        """Return the character showing bitmap, uploading it if needed."""
+        bitmap = bytes(bitmap)
+        self.clock += 1
+        for slot in range(8):
+            if self.slots[slot] == bitmap:
+                self.stamps[slot] = self.clock
+                return chr(slot)
+        slot = self._victim()
+        self.slots[slot] = bitmap
+        self.stamps[slot] = self.clock
+        self.lcd.custom_char(slot, bitmap)
+        return chr(slot)
+
+    def _victim(self):
+        # Free slot first, then the least recently used slot that is not on
+        # the display, then the least recently used slot.
+        best = hidden = -1
+        for slot in range(8):
+            if self.slots[slot] is None:
+                return slot
+            if best < 0 or self.stamps[slot] < self.stamps[best]:
+                best = slot
+            if (not self.lcd.displays(slot) and
+                    (hidden < 0 or self.stamps[slot] < self.stamps[hidden])):
+                hidden = slot
+        return hidden if hidden >= 0 else best
+
+    def load(self, bitmaps):
+        """Make bitmaps (up to 8) the resident glyph set, in one upload.
+
+        Returns the characters showing them, in order. Use it to switch
+        whole sets, e.g. bar graph blocks vs. menu arrows, at once.
+        """
+        bitmaps = [bytes(bitmap) for bitmap in bitmaps[:8]]
+        self.clock += 1
+        for slot in range(8):
+            self.slots[slot] = bitmaps[slot] if slot < len(bitmaps) else None
+            self.stamps[slot] = self.clock
+        self.lcd.custom_chars(bitmaps)
+        return ''.join(chr(slot) for slot in range(len(bitmaps)))
+
+    def reset(self):
+        """Forget all slots, e.g. after the LCD was reinitialised."""
+        for slot in range(8):
+            self.slots[slot] = None
+            self.stamps[slot] = 0
+
+
+def bar(cache, fraction, width):
+    """Return width characters drawing a bar filled to fraction (0 to 1)."""
+    if fraction < 0:
+        fraction = 0
+    elif fraction > 1:
+        fraction = 1
+    full, part = divmod(int(fraction * width * 5 + 0.5), 5)
+    text = FULL_BLOCK * full
+    if part:
+        text += cache.char(BAR_GLYPHS[part - 1])
+    return text + ' ' * (width - len(text))
@@ -0,0 +1,77 @@
+# Parallel debounce of GPIO inputs from single register snapshots.
+#
+# Every tick reads the RP2040 SIO GPIO_IN register once, which holds the
+# level of all 30 GPIOs, and debounces every watched input at once with a
+# 2-bit vertical counter: bit n of ct0/ct1 is the counter of GPIO n, so a
+# handful of integer operations update all counters together. An input
+# changes state after 4 ticks in a row that disagree with it. Testing an
+# input is then a bit test on the debounced mask.
+#
+# On the host, host.install() provides machine.mem32 as a dict, which
+# serves as the fake register:
+#
+#   machine.mem32[SIO_GPIO_IN] = 1 << 5
+
+import machine
+from machine import disable_irq, enable_irq
+from micropython import const
+
+SIO_GPIO_IN = const(0xd0000004)     # SIO_BASE + GPIO_IN
+
+
+class GpioSampler:
+
+    def __init__(self, pins):
+        # pins is a dict of name: GPIO number, such as main.inPin
+        self.bits = dict((name, 1 << gpio) for name, gpio in pins.items())
+        self.mask = 0
+        for bit in self.bits.values():
+            self.mask |= bit
+        self.state = self.read()    # debounced levels
+        self.ct0 = self.mask        # counters start at 3, the idle value
+        self.ct1 = self.mask
+        self.rose = 0               # debounced rising edges not yet read
+
+    def read(self):
+        """One snapshot of the watched inputs."""
+        return machine.mem32[SIO_GPIO_IN] & self.mask
+
+    def tick(self, timer=None):
+        """Take a snapshot and advance every counter; Timer callback."""
+        mask = self.mask
+        delta = (self.state ^ self.read())
+        # Counters of the inputs that agree with their state go back to 3,
+        # the others count down and the inputs toggle when they pass 0.
+        ct0 = ~(self.ct0 & delta) & mask
+        ct1 = (ct0 ^ (self.ct1 & delta)) & mask
+        toggle = delta & ct0 & ct1
+        self.ct0 = ct0
+        self.ct1 = ct1
+        self.state ^= toggle
+        self.rose |= toggle & self.state
+
+    def test(self, bits):
+        """True if any input of the bit mask is debounced high."""
+        return bool(self.state & bits)
+
+    def value(self, name):
+        """Debounced level of input name. A press that was seen but has
+        ended since the last call still reads 1, once."""
+        bit = self.bits[name]
+        # tick() sets rose from the Timer IRQ, read and clear it in one go
+        irq_state = disable_irq()
+        level = 1 if (self.state | self.rose) & bit else 0
+        self.rose &= ~bit
+        enable_irq(irq_state)
+        return level
+
+    def forget(self, name=None):
+        """Drop the presses not read yet, of input name or of every input,
+        so that an edge seen earlier isn't reported in a later context."""
+        bit = self.mask if name is None else self.bits[name]
+        irq_state = disable_irq()
+        self.rose &= ~bit
+        enable_irq(irq_state)
+
+
+############### END OF CLASS ################
@@ -0,0 +1,277 @@
+# Host-side stand-ins for the MicroPython modules used by the firmware.
+#
+# Running the display and input code under CPython needs utime, machine,
+# micropython and framebuf. install() registers minimal versions of the ones that are
+# missing; on the Pico it does nothing. Time is virtual: sleeping advances
+# a VirtualClock instead of waiting, so that benchmarks report modelled
+# time and run instantly.
+#
+# main.py also needs ujson and uasyncio, which map onto json and asyncio.
+# asyncio sleeps in real time and leaves the VirtualClock alone.
+
+import asyncio
+import json
+import sys
+from collections import defaultdict
+
+
+class VirtualClock:
+
+    def __init__(self):
+        self.us = 0
+
+    def advance_us(self, usecs):
+        self.us += int(usecs)
+
+
+clock = VirtualClock()
+
+_TICKS_PERIOD = 1 << 30
+
+
+class _Utime:
+    # Subset of utime driven by the virtual clock
+
+    def sleep(self, secs):
+        clock.advance_us(secs * 1000000)
+
+    def sleep_ms(self, msecs):
+        clock.advance_us(msecs * 1000)
+
+    def sleep_us(self, usecs):
+        clock.advance_us(usecs)
+
+    def ticks_us(self):
+        return clock.us % _TICKS_PERIOD
+
+    def ticks_ms(self):
+        return (clock.us // 1000) % _TICKS_PERIOD
+
+    def ticks_add(self, ticks, delta):
+        return (ticks + delta) % _TICKS_PERIOD
+
+    def ticks_diff(self, ticks1, ticks2):
+        diff = (ticks1 - ticks2) % _TICKS_PERIOD
+        if diff >= _TICKS_PERIOD // 2:
+            diff -= _TICKS_PERIOD
+        return diff
+
+
+class Pin:
+    # GPIO stand-in; tests set the level with value(v) and call irq handlers
+
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=IN, pull=None, value=0):
+        self.id = id
+        self.level = value
+        self.handler = None
+        self.trigger = 0
+
+    def value(self, v=None):
+        if v is None:
+            return self.level
+        self.level = 1 if v else 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self.handler = handler
+        self.trigger = trigger
+
+    def drive(self, v):
+        # Change the level and run the irq handler like the hardware would
+        v = 1 if v else 0
+        if v == self.level:
+            return
+        self.level = v
+        edge = self.IRQ_RISING if v else self.IRQ_FALLING
+        if self.handler and self.trigger & edge:
+            self.handler(self)
+
+
+class Timer:
+    # Timer stand-in; callbacks run when the test calls fire()
+
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.mode = self.PERIODIC
+        self.callback = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, freq=None, period=None, callback=None,
+             hard=False):
+        self.mode = mode
+        self.period = period if freq is None else 1000 // freq
+        self.callback = callback
+
+    def deinit(self):
+        self.callback = None
+
+    def fire(self):
+        callback = self.callback
+        if self.mode == self.ONE_SHOT:
+            self.callback = None
+        if callback:
+            callback(self)
+
+
+class I2C:
+    # Placeholder so that "from machine import I2C" works; pass a stand-in
+    # such as lcd_emu.Pcf8574Hd44780 where an I2C bus is expected.
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class ADC:
+    # ADC stand-in; tests set the reading in value
+
+    def __init__(self, id):
+        self.id = id
+        self.value = 0
+
+    def read_u16(self):
+        return self.value
+
+
+class _Machine:
+    Pin = Pin
+    Timer = Timer
+    I2C = I2C
+    ADC = ADC
+
+    def __init__(self):
+        # Registers that were never written read as 0
+        self.mem32 = defaultdict(int)
+
+    def freq(self, hz=None):
+        return 125000000
+
+    def disable_irq(self):
+        return 0
+
+    def enable_irq(self, state):
+        pass
+
+
+class _Micropython:
+
+    def const(self, value):
+        return value
+
+    def schedule(self, func, arg):
+        func(arg)
+
+    def alloc_emergency_exception_buf(self, size):
+        pass
+
+
+class FrameBuffer:
+    # MONO_VLSB only. The font is not modelled: text() draws every
+    # character but space as a filled box.
+
+    def __init__(self, buf, width, height, fmt, stride=None):
+        self.buf = buf
+        self.width = width
+        self.height = height
+
+    def fill(self, c):
+        value = 0xff if c else 0
+        for i in range(len(self.buf)):
+            self.buf[i] = value
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        i = (y >> 3) * self.width + x
+        bit = 1 << (y & 7)
+        if c is None:
+            return 1 if self.buf[i] & bit else 0
+        if c:
+            self.buf[i] |= bit
+        else:
+            self.buf[i] &= ~bit
+
+    def fill_rect(self, x, y, w, h, c):
+        for yy in range(y, y + h):
+            for xx in range(x, x + w):
+                self.pixel(xx, yy, c)
+
+    def text(self, s, x, y, c=1):
+        for ch in s:
+            if ch != ' ':
+                self.fill_rect(x + 1, y, 6, 7, c)
+            x += 8
+
+
+# clk/dt levels of one detent of a rotary encoder, from the 11 rest state
+_CW = ((1, 0), (0, 0), (0, 1), (1, 1))
+_CCW = ((0, 1), (0, 0), (1, 0), (1, 1))
+
+
+def quadrature(clk, dt, steps, step_us=1000):
+    """Turn an encoder on Pins clk and dt by steps detents (negative for
+    counter-clockwise), one level change every step_us of virtual time."""
+    for _ in range(abs(steps)):
+        for clk_level, dt_level in (_CW if steps > 0 else _CCW):
+            clk.drive(clk_level)
+            dt.drive(dt_level)
+            clock.advance_us(step_us)
+
+
+class _Framebuf:
+    MONO_VLSB = 0
+    FrameBuffer = FrameBuffer
+
+
+class ThreadSafeFlag:
+    # uasyncio.ThreadSafeFlag: wait() returns once set, and clears it
+
+    def __init__(self):
+        self.event = asyncio.Event()
+
+    def set(self):
+        self.event.set()
+
+    async def wait(self):
+        await self.event.wait()
+        self.event.clear()
+
+
+def _sleep_ms(msecs):
+    return asyncio.sleep(msecs / 1000)
+
+
+class _Uasyncio:
+    # asyncio with the uasyncio additions used by the firmware
+
+    sleep_ms = staticmethod(_sleep_ms)
+    ThreadSafeFlag = ThreadSafeFlag
+
+    def __getattr__(self, name):
+        return getattr(asyncio, name)
+
+
+class _Ujson:
+
+    def __getattr__(self, name):
+        return getattr(json, name)
+
+
+def install():
+    """Register the stand-in modules that this interpreter lacks."""
+    for name, module in (('utime', _Utime), ('machine', _Machine),
+                         ('micropython', _Micropython),
+                         ('framebuf', _Framebuf), ('uasyncio', _Uasyncio),
+                         ('ujson', _Ujson)):
+        try:
+            __import__(name)
+        except ImportError:
+            sys.modules[name] = module()
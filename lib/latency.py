@@ -0,0 +1,112 @@
+# Reaction time instrumentation.
+#
+# LatencyMonitor keeps, per transition such as "CloseLmt>Open", the time
+# from the limit switch edge to the start of the output pulse that answers
+# it, and the width of that pulse. Times come from utime.ticks_us, the edge
+# from the input IRQ (edge_ring.EdgeInputs.rise_us, the first edge of the
+# bounce burst), so they include the debounce time and the time lost in the
+# main loop. The countdown that the door is meant to wait
+# between the two is given as dwell_ms and left out.
+#
+# Each series keeps its last samples only (a rolling window), from which
+# percentiles and a histogram are computed when they are asked for.
+
+import utime
+from array import array
+
+# Upper bounds of the histogram buckets, in msec; the last one is open
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# ticks_us wraps, so ticks_diff is only right below 2**29 usec (536 s):
+# pulses that answer an edge from longer ago can't be timed
+MAX_SPAN_MS = 500000
+
+
+class Histogram:
+
+    def __init__(self, size=64):
+        self.samples = array('l', [0] * size)
+        self.count = 0          # samples recorded since the start
+
+    def add(self, value):
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+
+    def values(self):
+        """The samples of the window, oldest first."""
+        size = len(self.samples)
+        if self.count <= size:
+            return list(self.samples[:self.count])
+        start = self.count % size
+        return list(self.samples[start:]) + list(self.samples[:start])
+
+    def percentile(self, pct):
+        """Value below which pct % of the window falls, None if empty."""
+        values = sorted(self.values())
+        if not values:
+            return None
+        return values[min(len(values) - 1, len(values) * pct // 100)]
+
+    def buckets(self, bounds):
+        """Count the samples of the window at or below each bound, the
+        last count being those above every bound."""
+        counts = [0] * (len(bounds) + 1)
+        for value in self.values():
+            i = 0
+            while i < len(bounds) and value > bounds[i]:
+                i += 1
+            counts[i] += 1
+        return counts
+
+
+class LatencyMonitor:
+
+    def __init__(self, size=64):
+        self.size = size
+        self.series = {}        # name: (reaction Histogram, width Histogram)
+        self.skipped = 0        # pulses too far from their edge to time
+
+    def record(self, name, edge_us, on_us, off_us, dwell_ms=0):
+        """Record one pulse on off_us - on_us answering the edge of edge_us,
+        dwell_ms being the wait the door was meant to do in between. A
+        pulse more than MAX_SPAN_MS after its edge is counted as skipped."""
+        late_us = utime.ticks_diff(on_us, edge_us) - dwell_ms * 1000
+        if dwell_ms > MAX_SPAN_MS or late_us < 0:
+            self.skipped += 1       # ticks_diff wrapped
+            return
+        if name not in self.series:
+            self.series[name] = (Histogram(self.size), Histogram(self.size))
+        reaction, width = self.series[name]
+        reaction.add(late_us)
+        width.add(utime.ticks_diff(off_us, on_us))
+
+    def summary(self, name):
+        """Return (count, p50, p95, max) in msec of the reaction time and
+        of the pulse width of transition name."""
+        result = []
+        for hist in self.series[name]:
+            result.append((hist.count,
+                           hist.percentile(50) // 1000,
+                           hist.percentile(95) // 1000,
+                           hist.percentile(100) // 1000))
+        return result
+
+    def dump(self):
+        """Print every series and its histogram, for the serial console."""
+        header = ''.join('{:>6}'.format('<=' + str(b)) for b in BUCKETS_MS)
+        print('latency ms    n  p50  p95  max' + header + '  more')
+        bounds = [b * 1000 for b in BUCKETS_MS]
+        for name in sorted(self.series):
+            print(name)
+            for label, hist in zip(('  reaction', '  pulse'), self.series[name]):
+                print('{:<10}{:>5}{:>5}{:>5}{:>5}'.format(
+                    label, hist.count,
+                    hist.percentile(50) // 1000,
+                    hist.percentile(95) // 1000,
+                    hist.percentile(100) // 1000) +
+                    ''.join('{:>6}'.format(c) for c in hist.buckets(bounds)))
+        if self.skipped:
+            print('skipped, too long after their edge:', self.skipped)
+
+
+############### END OF CLASS ################
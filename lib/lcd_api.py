@@ -1,4 +1,4 @@
-import time
+import utime
 
 class LcdApi:
     
@@ -7,6 +7,10 @@ class LcdApi:
     # them to the LCD.
     #
     # It is expected that a derived class will implement the hal_xxx functions.
+    # They form the backend interface: hal_write_command and hal_write_data
+    # are required, hal_backlight_on/off, hal_batch_begin/end and hal_sleep_us
+    # are optional. Backends: pico_i2c_lcd (PCF8574, 4-bit), mcp23017_lcd
+    # (MCP23017, 8-bit) and ssd1306_lcd (SSD1306 OLED, emulated controller).
     #
     # The following constant names were lifted from the avrlib lcd.h header file,
     # with bit numbers changed to bit masks.
@@ -43,17 +47,53 @@ class LcdApi:
     LCD_RW_WRITE        = 0
     LCD_RW_READ         = 1
 
-    def __init__(self, num_lines, num_columns):
+    # DDRAM address of the first column of each line, by panel geometry
+    # ("COLUMNSxLINES"). A geometry that is not listed gets the usual
+    # 0x00, 0x40, columns, 0x40 + columns layout.
+    GEOMETRIES = {
+        '8x2'       : (0x00, 0x40),
+        '16x1'      : (0x00,),
+        '16x2'      : (0x00, 0x40),
+        '20x2'      : (0x00, 0x40),
+        '40x2'      : (0x00, 0x40),
+        '16x4'      : (0x00, 0x40, 0x10, 0x50),
+        '20x4'      : (0x00, 0x40, 0x14, 0x54),
+        # 16x4 panels wired like a 20x4 (e.g. some KS0066 based modules)
+        '16x4-20'   : (0x00, 0x40, 0x14, 0x54),
+    }
+
+    def __init__(self, num_lines, num_columns, geometry=None):
         self.num_lines = num_lines
         if self.num_lines > 4:
             self.num_lines = 4
         self.num_columns = num_columns
         if self.num_columns > 40:
             self.num_columns = 40
+        # geometry is a GEOMETRIES name or a tuple of line start addresses
+        if geometry is None:
+            geometry = '{}x{}'.format(self.num_columns, self.num_lines)
+        if isinstance(geometry, str):
+            geometry = self.GEOMETRIES.get(geometry)
+        if geometry is None:
+            geometry = (0x00, 0x40, self.num_columns, 0x40 + self.num_columns)
+        self.row_offsets = geometry
+        # DDRAM address of every visible cell, looked up by move_to
+        self.addr_table = bytearray(self.num_lines * self.num_columns)
+        for y in range(self.num_lines):
+            for x in range(self.num_columns):
+                self.addr_table[y * self.num_columns + x] = geometry[y] + x
         self.cursor_x = 0
         self.cursor_y = 0
         self.implied_newline = False
         self.backlight = True
+        # In-RAM copy of what is on the glass, one byte per visible cell,
+        # so that writes only need to send the cells that changed.
+        self.shadow = bytearray(self.num_lines * self.num_columns)
+        # DDRAM address the controller writes next (-1 when unknown), so that
+        # runs of data can rely on the LCD_ENTRY_INC auto-increment.
+        self.hw_addr = -1
+        # Columns the display is shifted left by, see marquee()
+        self.shift = 0
         self.display_off()
         self.backlight_on()
         self.clear()
@@ -67,6 +107,11 @@ class LcdApi:
         self.hal_write_command(self.LCD_HOME)
         self.cursor_x = 0
         self.cursor_y = 0
+        self.hw_addr = 0
+        self.shift = 0
+        shadow = self.shadow
+        for i in range(len(shadow)):
+            shadow[i] = 0x20
 
     def show_cursor(self):
         # Causes the cursor to be made visible
@@ -116,12 +161,30 @@ class LcdApi:
         # position is zero based (i.e. cursor_x == 0 indicates first column).
         self.cursor_x = cursor_x
         self.cursor_y = cursor_y
-        addr = cursor_x & 0x3f
-        if cursor_y & 1:
-            addr += 0x40    # Lines 1 & 3 add 0x40
-        if cursor_y & 2:    # Lines 2 & 3 add number of columns
-            addr += self.num_columns
+        addr = self.ddram_addr(cursor_x, cursor_y)
         self.hal_write_command(self.LCD_DDRAM | addr)
+        self.hw_addr = addr
+
+    def ddram_addr(self, cursor_x, cursor_y):
+        # Returns the DDRAM address of the indicated position, from the table
+        # built for the panel geometry. On usual 4 line panels lines 0 & 2
+        # share the 0x00 line of the controller and lines 1 & 3 the 0x40
+        # line, so running off the end of line 0 continues on line 2.
+        if 0 <= cursor_x < self.num_columns:
+            return self.addr_table[cursor_y * self.num_columns + cursor_x]
+        return (self.row_offsets[cursor_y] + (cursor_x & 0x3f)) & 0x7f
+
+    def advance_addr(self, count):
+        # Follows the controller's address counter over count data writes.
+        # In two line mode it wraps from 0x27 to 0x40 and from 0x67 to 0x00.
+        if self.hw_addr < 0:
+            return
+        addr = self.hw_addr + count
+        if 0x28 <= addr < 0x40:
+            addr += 0x18
+        elif addr >= 0x68:
+            addr -= 0x68
+        self.hw_addr = addr
 
     def putchar(self, char):
         # Writes the indicated character to the LCD at the current cursor
@@ -134,7 +197,17 @@ class LcdApi:
             else:
                 self.cursor_x = self.num_columns
         else:
-            self.hal_write_data(ord(char))
+            code = ord(char) & 0xff
+            cell = self.cursor_y * self.num_columns + self.cursor_x
+            if self.shadow[cell] != code:
+                if self.shift:
+                    self.marquee_stop()
+                if self.hw_addr != self.ddram_addr(self.cursor_x,
+                                                   self.cursor_y):
+                    self.move_to(self.cursor_x, self.cursor_y)
+                self.hal_write_data(code)
+                self.advance_addr(1)
+                self.shadow[cell] = code
             self.cursor_x += 1
         if self.cursor_x >= self.num_columns:
             self.cursor_x = 0 
@@ -142,35 +215,190 @@ class LcdApi:
             self.implied_newline = (char != '\n')
         if self.cursor_y >= self.num_lines:
             self.cursor_y = 0
-        self.move_to(self.cursor_x, self.cursor_y)
 
     def putstr(self, string):
         # Write the indicated string to the LCD at the current cursor
         # position and advances the cursor position appropriately.
+        self.hal_batch_begin()
         for char in string:
             self.putchar(char)
+        self.hal_batch_end()
     
     def custom_char(self, location, charmap):
         # Write a character to one of the 8 CGRAM locations, available
         # as chr(0) through chr(7).
+        self.custom_chars((charmap,), location)
+
+    def custom_chars(self, charmaps, location=0):
+        # Write several characters to consecutive CGRAM locations, starting
+        # at location, as one batch: the CGRAM address is set once and the
+        # auto-increment walks through the rows of all the characters.
+        # Characters that would go past chr(7) are ignored.
         location &= 0x7
+        count = min(len(charmaps), 8 - location)
+        self.hal_batch_begin()
         self.hal_write_command(self.LCD_CGRAM | (location << 3))
-        self.hal_sleep_us(40)
-        for i in range(8):
-            self.hal_write_data(charmap[i])
-            self.hal_sleep_us(40)
-        self.move_to(self.cursor_x, self.cursor_y)
+        for n in range(count):
+            charmap = charmaps[n]
+            for i in range(8):
+                self.hal_write_data(charmap[i])
+        self.hal_batch_end()
+        # The address counter now points into CGRAM, the next write to the
+        # display has to set a DDRAM address first.
+        self.hw_addr = -1
+
+    def displays(self, code):
+        # Returns True if character code is shown in any visible cell,
+        # e.g. to know whether a CGRAM slot can be redefined unnoticed.
+        for cell in self.shadow:
+            if cell == code:
+                return True
+        return False
 
     def write_line(self, string, line, pos=1):
-        """write string to lcd, at specified line and position."""
-        self.cursor_x = pos-1
-        self.cursor_y = line-1
-        self.move_to(self.cursor_x, self.cursor_y)
-        for char in string:
-            self.cursor_x += 1
-            self.hal_write_data(ord(char))
-            self.move_to(self.cursor_x, self.cursor_y)
+        """write string to lcd, at specified line and position.
+
+        The string is compared with the shadow copy of the line and only the
+        cells that changed are sent, grouped into runs. Characters falling
+        outside the line are dropped.
+        """
+        x = pos - 1
+        y = line - 1
+        if 0 <= y < self.num_lines:
+            self.hal_batch_begin()
+            shadow = self.shadow
+            row = y * self.num_columns
+            start = -1
+            for char in string:
+                if 0 <= x < self.num_columns:
+                    code = ord(char) & 0xff
+                    if shadow[row + x] != code:
+                        shadow[row + x] = code
+                        if start < 0:
+                            start = x
+                    elif start >= 0:
+                        self._write_run(start, x, y)
+                        start = -1
+                x += 1
+            if start >= 0:
+                self._write_run(start, min(x, self.num_columns), y)
+            self.hal_batch_end()
+        else:
+            x += len(string)
+        # Leave the cursor where putchar would have: wrapped to the start
+        # of the next line once past the end of this one.
+        if x >= self.num_columns:
+            x = 0
+            y += 1
+        self.cursor_x = max(x, 0)
+        self.cursor_y = y % self.num_lines
+
+    def update_line(self, frame, line):
+        """Bring one line of the LCD up to date with frame.
+
+        frame is a buffer laid out like shadow, one byte per visible cell.
+        As in write_line, only the cells that differ are sent.
+        """
+        y = line - 1
+        shadow = self.shadow
+        row = y * self.num_columns
+        start = -1
+        self.hal_batch_begin()
+        for x in range(self.num_columns):
+            code = frame[row + x]
+            if shadow[row + x] != code:
+                shadow[row + x] = code
+                if start < 0:
+                    start = x
+            elif start >= 0:
+                self._write_run(start, x, y)
+                start = -1
+        if start >= 0:
+            self._write_run(start, self.num_columns, y)
+        self.hal_batch_end()
+
+    def _write_run(self, start, end, y):
+        # Send the shadow cells start..end-1 of line y to the LCD. The
+        # address is only set when the controller is not already there;
+        # the following cells are reached through auto-increment.
+        row = y * self.num_columns
+        if self.shift:
+            self.marquee_stop()
+        if self.hw_addr != self.ddram_addr(start, y):
+            self.move_to(start, y)
+        for x in range(start, end):
+            self.hal_write_data(self.shadow[row + x])
+        self.advance_addr(end - start)
     
+    def scroll_lines(self):
+        # Returns the lines (1 based) that marquee() may scroll. The HD44780
+        # shifts all lines together, so a line qualifies only if it has a
+        # DDRAM line of its own, which rules out 4 line panels where lines
+        # 1 & 3 and 2 & 4 share one, and if all other lines are blank so
+        # that nothing else visibly moves.
+        lines = []
+        for y in range(self.num_lines):
+            for other in range(self.num_lines):
+                if other == y:
+                    continue
+                if ((self.row_offsets[other] & 0x40) ==
+                        (self.row_offsets[y] & 0x40)):
+                    break
+                if not self._blank(other):
+                    break
+            else:
+                lines.append(y + 1)
+        return lines
+
+    def _blank(self, y):
+        row = y * self.num_columns
+        for x in range(row, row + self.num_columns):
+            if self.shadow[x] != 0x20:
+                return False
+        return True
+
+    def marquee(self, string, line):
+        """Write string to the whole DDRAM line behind line, for scrolling.
+
+        Up to 40 characters (80 on a one line panel) are stored, so that
+        each scroll() then costs a single display shift command instead of
+        a line rewrite. Returns True if string is wider than the display
+        and needs scrolling. Raises ValueError if line can't be scrolled,
+        see scroll_lines(). Any other write to the display ends the marquee.
+        """
+        if line not in self.scroll_lines():
+            raise ValueError('line {} can not scroll'.format(line))
+        if self.shift:
+            self.marquee_stop()
+        y = line - 1
+        size = self._ddram_line_size()
+        self.hal_batch_begin()
+        self.hal_write_command(self.LCD_DDRAM | (self.row_offsets[y] & 0x40))
+        self.hw_addr = self.row_offsets[y] & 0x40
+        for i in range(size):
+            code = ord(string[i]) & 0xff if i < len(string) else 0x20
+            self.hal_write_data(code)
+            if i < self.num_columns:
+                self.shadow[y * self.num_columns + i] = code
+        self.hal_batch_end()
+        self.advance_addr(size)
+        return len(string) > self.num_columns
+
+    def scroll(self):
+        # Shifts the display one column to the left, wrapping around the
+        # DDRAM line, with a single command.
+        self.hal_write_command(self.LCD_MOVE | self.LCD_MOVE_DISP)
+        self.shift = (self.shift + 1) % self._ddram_line_size()
+
+    def marquee_stop(self):
+        # Brings the display back to its unshifted position.
+        self.hal_write_command(self.LCD_HOME)
+        self.hw_addr = 0
+        self.shift = 0
+
+    def _ddram_line_size(self):
+        return 80 if self.num_lines == 1 else 40
+
     def write_line_center(self, string, line):
         """Write sting to center of lcd, at specified line."""
         pos = (self.num_columns - len(string)) //2
@@ -200,6 +428,18 @@ class LcdApi:
         # It is expected that a derived HAL class will implement this function.
         raise NotImplementedError
 
+    def hal_batch_begin(self):
+        # Marks the start of a group of writes that the hal layer may send
+        # to the LCD in a single bus transfer.
+        # If desired, a derived HAL class will implement this function.
+        pass
+
+    def hal_batch_end(self):
+        # Marks the end of a group of writes started by hal_batch_begin.
+        # The hal layer must have sent everything to the LCD on return.
+        # If desired, a derived HAL class will implement this function.
+        pass
+
     def hal_sleep_us(self, usecs):
         # Sleep for some time (given in microseconds)
-        time.sleep_us(usecs)
+        utime.sleep_us(usecs)
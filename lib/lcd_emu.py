@@ -0,0 +1,333 @@
+# Host-side model of a PCF8574 I2C backpack driving a HD44780 LCD.
+#
+# Pcf8574Hd44780 stands in for the I2C object given to pico_i2c_lcd.I2cLcd.
+# It decodes the nibble/E strobe protocol into a simulated controller with
+# DDRAM, CGRAM, address counter, entry mode, display shift and busy time,
+# so that LcdApi code runs unchanged and tests can assert what is on the
+# glass. Every transfer is counted and its bus time modelled, which makes it
+# usable to regression-check the cost of display code. I2cRecorder alone
+# only counts, for benchmarking the other display backends.
+#
+#   import host; host.install()
+#   from lcd_emu import Pcf8574Hd44780
+#   from pico_i2c_lcd import I2cLcd
+#   bus = Pcf8574Hd44780(4, 20)
+#   lcd = I2cLcd(bus, 0x27, 4, 20)
+#   lcd.write_line('HELLO', 1)
+#   bus.lines()[0]  ->  'HELLO               '
+
+from host import clock
+
+# PCF8574 pins, as wired in pico_i2c_lcd
+MASK_RS = 0x01
+MASK_RW = 0x02
+MASK_E  = 0x04
+
+# HD44780 execution times in usec
+EXEC_US = 37
+CLEAR_US = 1520
+
+
+class I2cRecorder:
+    # I2C stand-in that counts transfers and models their bus time.
+    # Subclasses decode the bytes in _write and supply them in _read.
+
+    def __init__(self, addr, freq=400000):
+        self.addr = addr
+        self.freq = freq
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Zero the counters."""
+        self.transactions = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.bus_us = 0
+
+    def stats(self):
+        """Return the counters as a dict."""
+        return {
+            'transactions': self.transactions,
+            'bytes_written': self.bytes_written,
+            'bytes_read': self.bytes_read,
+            'bus_us': self.bus_us,
+            }
+
+    def _bus(self, nbytes):
+        # Model one transfer: start, address byte, nbytes, stop, with
+        # 9 clocks per byte. Returns the time of the first data byte.
+        self.transactions += 1
+        byte_us = 9 * 1000000 / self.freq
+        start = clock.us + byte_us
+        us = (nbytes + 1) * byte_us + 2 * 1000000 / self.freq
+        self.bus_us += us
+        clock.advance_us(us)
+        return start, byte_us
+
+    def writeto(self, addr, buf):
+        return self.writevto(addr, (buf,))
+
+    def writevto(self, addr, vector):
+        if addr != self.addr:
+            raise OSError(19)       # ENODEV, nothing acknowledges
+        nbytes = 0
+        for buf in vector:
+            nbytes += len(buf)
+        t, byte_us = self._bus(nbytes)
+        self.bytes_written += nbytes
+        for buf in vector:
+            for byte in buf:
+                t += byte_us
+                self._write(byte, t)
+        return nbytes
+
+    def readfrom_into(self, addr, buf):
+        if addr != self.addr:
+            raise OSError(19)
+        self._bus(len(buf))
+        self.bytes_read += len(buf)
+        for i in range(len(buf)):
+            buf[i] = self._read()
+
+    def readfrom(self, addr, nbytes):
+        buf = bytearray(nbytes)
+        self.readfrom_into(addr, buf)
+        return bytes(buf)
+
+    def _write(self, byte, t):
+        pass
+
+    def _read(self):
+        return 0xff
+
+
+class Pcf8574Hd44780(I2cRecorder):
+
+    def __init__(self, num_lines=4, num_columns=20, addr=0x27, freq=400000,
+                 row_offsets=None):
+        self.num_lines = num_lines
+        self.num_columns = num_columns
+        self.row_offsets = row_offsets
+        self.port = 0xff            # PCF8574 outputs come up high
+        self.ddram = bytearray(b' ' * 0x80)
+        self.cgram = bytearray(64)
+        self.ac = 0                 # address counter
+        self.in_cgram = False
+        self.increment = True
+        self.entry_shift = False
+        self.shift = 0              # display shift, in columns
+        self.display_on = False
+        self.cursor = False
+        self.blink = False
+        self.four_bit = False
+        self.two_lines = False
+        self.high = None            # pending high nibble in 4-bit mode
+        self.read_low = False       # next read strobe gives the low nibble
+        self.busy_until = 0
+        I2cRecorder.__init__(self, addr, freq)
+
+    def reset_stats(self):
+        """Zero the counters."""
+        I2cRecorder.reset_stats(self)
+        self.commands = 0
+        self.data = 0
+        self.overruns = 0           # writes sent while the LCD was busy
+
+    def stats(self):
+        """Return the counters as a dict."""
+        stats = I2cRecorder.stats(self)
+        stats['commands'] = self.commands
+        stats['data'] = self.data
+        stats['overruns'] = self.overruns
+        return stats
+
+    # PCF8574 / HD44780 interface
+
+    def _write(self, byte, t):
+        prev = self.port
+        self.port = byte
+        if prev & MASK_E and not byte & MASK_E:
+            # Falling edge of E latches what was on the pins
+            if prev & MASK_RW:
+                # Reads take two strobes in 4-bit mode, one in 8-bit mode
+                if self.four_bit:
+                    self.read_low = not self.read_low
+            else:
+                self._nibble(prev & MASK_RS, prev >> 4, t)
+
+    def _read(self):
+        # Quasi-bidirectional port: the LCD drives D4-D7 while RW and E
+        # are high, the other pins read back what was written.
+        byte = self.port
+        if byte & MASK_RW and byte & MASK_E:
+            value = self._status()
+            nibble = value & 0x0f if self.read_low else value >> 4
+            byte = (byte & 0x0f) | (nibble << 4)
+        return byte
+
+    def _status(self):
+        busy = 0x80 if clock.us < self.busy_until else 0
+        return busy | (self.ac & 0x7f)
+
+    def _nibble(self, rs, nibble, t):
+        if not self.four_bit:
+            # 8-bit mode: D0-D3 are not wired and read as 0
+            self._execute(rs, nibble << 4, t)
+        elif self.high is None:
+            self.high = nibble
+        else:
+            byte = (self.high << 4) | nibble
+            self.high = None
+            self._execute(rs, byte, t)
+
+    def _execute(self, rs, byte, t):
+        if t < self.busy_until:
+            self.overruns += 1
+        busy = EXEC_US
+        if rs:
+            self.data += 1
+            self._write_data(byte)
+        else:
+            self.commands += 1
+            busy = self._command(byte)
+        self.busy_until = t + busy
+
+    def _command(self, cmd):
+        if cmd & 0x80:
+            self.ac = cmd & 0x7f
+            self.in_cgram = False
+        elif cmd & 0x40:
+            self.ac = cmd & 0x3f
+            self.in_cgram = True
+        elif cmd & 0x20:
+            self.four_bit = not cmd & 0x10
+            self.two_lines = bool(cmd & 0x08)
+        elif cmd & 0x10:
+            step = 1 if cmd & 0x04 else -1
+            if cmd & 0x08:
+                self.shift = (self.shift - step) % 40
+            else:
+                self._step_ac(step)
+        elif cmd & 0x08:
+            self.display_on = bool(cmd & 0x04)
+            self.cursor = bool(cmd & 0x02)
+            self.blink = bool(cmd & 0x01)
+        elif cmd & 0x04:
+            self.increment = bool(cmd & 0x02)
+            self.entry_shift = bool(cmd & 0x01)
+        elif cmd & 0x02:
+            self.ac = 0
+            self.in_cgram = False
+            self.shift = 0
+            return CLEAR_US
+        elif cmd & 0x01:
+            for i in range(len(self.ddram)):
+                self.ddram[i] = 0x20
+            self.ac = 0
+            self.in_cgram = False
+            self.shift = 0
+            self.increment = True
+            return CLEAR_US
+        return EXEC_US
+
+    def _write_data(self, byte):
+        if self.in_cgram:
+            self.cgram[self.ac & 0x3f] = byte & 0x1f
+            self.ac = (self.ac + (1 if self.increment else -1)) & 0x3f
+            return
+        self.ddram[self.ac] = byte
+        step = 1 if self.increment else -1
+        self._step_ac(step)
+        if self.entry_shift:
+            self.shift = (self.shift + step) % 40
+
+    def _step_ac(self, step):
+        # In two line mode DDRAM is 0x00-0x27 and 0x40-0x67, and the
+        # counter runs from the end of one line to the start of the other.
+        ac = self.ac + step
+        if self.two_lines:
+            if ac == 0x28:
+                ac = 0x40
+            elif ac == 0x68:
+                ac = 0x00
+            elif ac == 0x3f:
+                ac = 0x27
+            elif ac == -1:
+                ac = 0x67
+        else:
+            ac %= 0x50
+        self.ac = ac
+
+    # Inspection
+
+    def row_addr(self, line):
+        """DDRAM address of the first visible cell of line (0 based)."""
+        if self.row_offsets:
+            return self.row_offsets[line]
+        base = 0x40 if line & 1 else 0
+        if line & 2:
+            base += self.num_columns
+        return base
+
+    def lines(self):
+        """Return the visible text of each line, display shift applied."""
+        rows = []
+        for line in range(self.num_lines):
+            base = self.row_addr(line)
+            start = base & 0x40
+            text = ''
+            for col in range(self.num_columns):
+                addr = start + ((base - start + self.shift + col) % 40)
+                text += chr(self.ddram[addr])
+            rows.append(text)
+        return rows
+
+    def text(self):
+        """Return the visible text as one string, lines joined by newlines."""
+        return '\n'.join(self.lines())
+
+    def glyph(self, location):
+        """Return the 8 row bitmap of a CGRAM location."""
+        location &= 0x7
+        return bytes(self.cgram[location * 8:location * 8 + 8])
+
+
+def main():
+    # Print the bus cost of typical screen updates for each backend
+    import host
+    host.install()
+    from pico_i2c_lcd import I2cLcd
+    from mcp23017_lcd import Mcp23017Lcd
+    from ssd1306_lcd import Ssd1306Lcd
+
+    backends = (
+        ('PCF8574', Pcf8574Hd44780(4, 20),
+         lambda bus: I2cLcd(bus, 0x27, 4, 20, busy_poll=True)),
+        ('MCP23017', I2cRecorder(0x20),
+         lambda bus: Mcp23017Lcd(bus, 0x20, 4, 20)),
+        ('SSD1306', I2cRecorder(0x3c),
+         lambda bus: Ssd1306Lcd(bus, 0x3c, 4, 16)),
+        )
+    print('{:<10}{:<16}{:>6}{:>6}{:>9}'.format('backend', 'case', 'tx',
+                                               'bytes', 'bus us'))
+    for backend, bus, make in backends:
+        lcd = make(bus)
+        cols = lcd.num_columns
+        full = 'ABCDEFGHIJKLMNOPQRST'[:cols]
+        cases = (
+            ('full line', lambda: lcd.write_line(full, 1)),
+            ('same line again', lambda: lcd.write_line(full, 1)),
+            ('one digit', lambda: lcd.write_line(full[:-1] + '9', 1)),
+            ('clear line', lambda: lcd.clear_line(1)),
+            ('clear', lambda: lcd.clear()),
+            )
+        for name, case in cases:
+            bus.reset_stats()
+            case()
+            print('{:<10}{:<16}{:>6}{:>6}{:>9.0f}'.format(
+                backend, name, bus.transactions,
+                bus.bytes_written + bus.bytes_read, bus.bus_us))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import utime
+
+from lcd_api import LcdApi
+
+# MCP23017 registers, IOCON.BANK = 0
+IODIRA = 0x00
+IOCON  = 0x0A
+GPIOA  = 0x12
+GPIOB  = 0x13
+
+# IOCON.SEQOP: the register pointer toggles between GPIOA and GPIOB instead
+# of walking through all registers, so one transfer can alternate both ports.
+IOCON_SEQOP = 0x20
+
+# Port A carries D0-D7, port B pin definitions
+MASK_RS = 0x01          # GPB0
+MASK_RW = 0x02          # GPB1
+MASK_E  = 0x04          # GPB2
+MASK_BACKLIGHT = 0x08   # GPB3
+
+# Register byte, then 4 bytes per byte sent to the HD44780 (A, B with E,
+# A, B without E); room for a full CGRAM upload and its address command.
+TX_BUF_SIZE = 1 + 4 * 72
+
+class Mcp23017Lcd(LcdApi):
+    
+    # Implements a HD44780 character LCD connected in 8-bit mode via MCP23017
+    # on I2C. Each byte goes to the LCD whole, without the nibble split of
+    # the PCF8574 backpack, and a batch is sent in a single transfer.
+    #
+    # This is not cheaper on the bus: an LCD byte still costs 4 bus bytes,
+    # as on the batched PCF8574. E has to be written high then low on port
+    # B, and with SEQOP the pointer alternates, so port A is written before
+    # each of the two; without SEQOP it walks on to the other registers.
+
+    def __init__(self, i2c, i2c_addr, num_lines, num_columns, geometry=None):
+        self.i2c = i2c
+        self.i2c_addr = i2c_addr
+        self.tx_buf = bytearray(TX_BUF_SIZE)
+        self.tx_buf[0] = GPIOA
+        self.tx_len = 1
+        tx_view = memoryview(self.tx_buf)
+        self.tx_views = [tx_view[:n] for n in range(1, TX_BUF_SIZE + 1, 4)]
+        self.reg_buf = bytearray(3)
+        self.reg_view = memoryview(self.reg_buf)[:2]
+        self.batch_depth = 0
+        self.backlight = True
+        self.tx_bytes = 0
+        self.tx_count = 0
+        self.write_reg(IOCON, IOCON_SEQOP)
+        self.write_reg(IODIRA, 0x00, 0x00)  # both ports are outputs
+        utime.sleep_ms(20)   # Allow LCD time to powerup
+        # Send reset 3 times, the LCD stays in 8-bit mode
+        for delay in (5, 1, 1):
+            self.hal_write_command(self.LCD_FUNCTION_RESET)
+            utime.sleep_ms(delay)
+        cmd = self.LCD_FUNCTION | self.LCD_FUNCTION_8BIT
+        if num_lines > 1:
+            cmd |= self.LCD_FUNCTION_2LINES
+        self.hal_write_command(cmd)
+        LcdApi.__init__(self, num_lines, num_columns, geometry)
+
+    def write_reg(self, reg, value_a, value_b=None):
+        # Write a register, or an A/B register pair
+        buf = self.reg_buf
+        buf[0] = reg
+        buf[1] = value_a
+        if value_b is None:
+            self.i2c_send(self.reg_view)
+        else:
+            buf[2] = value_b
+            self.i2c_send(buf)
+
+    def hal_backlight_on(self):
+        # Allows the hal layer to turn the backlight on
+        self.write_reg(GPIOB, MASK_BACKLIGHT)
+
+    def hal_backlight_off(self):
+        #Allows the hal layer to turn the backlight off
+        self.write_reg(GPIOB, 0)
+
+    def hal_write_command(self, cmd):
+        # Write a command to the LCD. Data is latched on the falling edge of E.
+        self.queue_byte(cmd, 0)
+        if cmd <= 3:
+            # The home and clear commands require a worst case delay of 4.1 msec
+            self.hal_flush()
+            utime.sleep_ms(5)
+        elif not self.batch_depth:
+            self.hal_flush()
+
+    def hal_write_data(self, data):
+        # Write data to the LCD. Data is latched on the falling edge of E.
+        self.queue_byte(data, MASK_RS)
+        if not self.batch_depth:
+            self.hal_flush()
+
+    def hal_batch_begin(self):
+        # Queue writes until the matching hal_batch_end
+        self.batch_depth += 1
+
+    def hal_batch_end(self):
+        # Send everything queued since the outermost hal_batch_begin
+        self.batch_depth -= 1
+        if not self.batch_depth:
+            self.hal_flush()
+
+    def hal_flush(self):
+        # Send the queued bytes in a single I2C transfer, starting at GPIOA
+        if self.tx_len > 1:
+            self.i2c_send(self.tx_views[(self.tx_len - 1) >> 2])
+            self.tx_len = 1
+
+    def queue_byte(self, value, mode):
+        # Queue one byte for the LCD: data on port A, then E pulsed on port
+        # B while port A holds the data, mode being MASK_RS or 0.
+        if self.tx_len == TX_BUF_SIZE:
+            self.hal_flush()
+        ctrl = mode | (MASK_BACKLIGHT if self.backlight else 0)
+        buf = self.tx_buf
+        i = self.tx_len
+        buf[i] = value
+        buf[i + 1] = ctrl | MASK_E
+        buf[i + 2] = value
+        buf[i + 3] = ctrl
+        self.tx_len = i + 4
+
+    def i2c_send(self, buf):
+        # Single point where bytes leave for the MCP23017, counted so that
+        # bus usage can be measured against a stand-in I2C object.
+        self.i2c.writeto(self.i2c_addr, buf)
+        self.tx_bytes += len(buf)
+        self.tx_count += 1
+
+    def reset_counters(self):
+        # Zero the byte and transaction counters
+        self.tx_bytes = 0
+        self.tx_count = 0
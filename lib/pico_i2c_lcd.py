@@ -1,5 +1,4 @@
 import utime
-import gc
 
 from lcd_api import LcdApi
 from machine import I2C
@@ -12,14 +11,40 @@ MASK_E  = 0x04       # P2
 SHIFT_BACKLIGHT = 3  # P3
 SHIFT_DATA      = 4  # P4-P7
 
+# Each byte sent to the HD44780 takes 4 PCF8574 bytes (2 nibbles, E strobed);
+# room for a full CGRAM upload (8 x 8 rows) and its address command.
+TX_BUF_SIZE = 4 * 72
+
+# Longest wait for the busy flag before going back to the timed delays
+BUSY_TIMEOUT_US = 10000
+
 class I2cLcd(LcdApi):
     
     #Implements a HD44780 character LCD connected via PCF8574 on I2C
 
-    def __init__(self, i2c, i2c_addr, num_lines, num_columns):
+    def __init__(self, i2c, i2c_addr, num_lines, num_columns, busy_poll=False,
+                 geometry=None):
         self.i2c = i2c
         self.i2c_addr = i2c_addr
-        self.i2c.writeto(self.i2c_addr, bytes([0]))
+        # Poll the busy flag after clear/home instead of sleeping 5 msec.
+        # Turned off by itself if the flag can't be read.
+        self.busy_poll = busy_poll
+        # Bytes queued for the PCF8574 while a batch is open. All buffers are
+        # allocated here so that writing to the LCD allocates nothing; the
+        # views of tx_buf are indexed by the number of queued LCD bytes.
+        self.tx_buf = bytearray(TX_BUF_SIZE)
+        self.tx_len = 0
+        tx_view = memoryview(self.tx_buf)
+        self.tx_views = [tx_view[:n] for n in range(0, TX_BUF_SIZE + 1, 4)]
+        self.byte_buf = bytearray(1)
+        self.nibble_buf = bytearray(2)
+        self.strobe_buf = bytearray(3)
+        self.batch_depth = 0
+        # Bus usage counters, see reset_counters()
+        self.tx_bytes = 0
+        self.tx_count = 0
+        self.rx_bytes = 0
+        self.write_byte(0)
         utime.sleep_ms(20)   # Allow LCD time to powerup
         # Send reset 3 times
         self.hal_write_init_nibble(self.LCD_FUNCTION_RESET)
@@ -31,56 +56,132 @@ class I2cLcd(LcdApi):
         # Put LCD into 4-bit mode
         self.hal_write_init_nibble(self.LCD_FUNCTION)
         utime.sleep_ms(1)
-        LcdApi.__init__(self, num_lines, num_columns)
+        LcdApi.__init__(self, num_lines, num_columns, geometry)
         cmd = self.LCD_FUNCTION
         if num_lines > 1:
             cmd |= self.LCD_FUNCTION_2LINES
         self.hal_write_command(cmd)
-        gc.collect()
 
     def hal_write_init_nibble(self, nibble):
         # Writes an initialization nibble to the LCD.
         # This particular function is only used during initialization.
         byte = ((nibble >> 4) & 0x0f) << SHIFT_DATA
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        gc.collect()
+        buf = self.nibble_buf
+        buf[0] = byte | MASK_E
+        buf[1] = byte
+        self.i2c_send(buf)
         
     def hal_backlight_on(self):
         # Allows the hal layer to turn the backlight on
-        self.i2c.writeto(self.i2c_addr, bytes([1 << SHIFT_BACKLIGHT]))
-        gc.collect()
+        self.write_byte(1 << SHIFT_BACKLIGHT)
         
     def hal_backlight_off(self):
         #Allows the hal layer to turn the backlight off
-        self.i2c.writeto(self.i2c_addr, bytes([0]))
-        gc.collect()
+        self.write_byte(0)
         
     def hal_write_command(self, cmd):
         # Write a command to the LCD. Data is latched on the falling edge of E.
-        byte = ((self.backlight << SHIFT_BACKLIGHT) |
-                (((cmd >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        byte = ((self.backlight << SHIFT_BACKLIGHT) |
-                ((cmd & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
+        self.queue_byte(cmd, 0)
         if cmd <= 3:
             # The home and clear commands require a worst case delay of 4.1 msec
-            utime.sleep_ms(5)
-        #gc.collect()
+            self.hal_flush()
+            if not (self.busy_poll and self.wait_ready()):
+                utime.sleep_ms(5)
+        elif not self.batch_depth:
+            self.hal_flush()
 
     def hal_write_data(self, data):
         # Write data to the LCD. Data is latched on the falling edge of E.
-        byte = (MASK_RS |
+        self.queue_byte(data, MASK_RS)
+        if not self.batch_depth:
+            self.hal_flush()
+
+    def hal_batch_begin(self):
+        # Queue writes until the matching hal_batch_end
+        self.batch_depth += 1
+
+    def hal_batch_end(self):
+        # Send everything queued since the outermost hal_batch_begin
+        self.batch_depth -= 1
+        if not self.batch_depth:
+            self.hal_flush()
+
+    def hal_flush(self):
+        # Send the queued bytes in a single I2C transfer. The PCF8574 latches
+        # each byte in turn, and at 400 kHz one E strobe pair already lasts
+        # longer than the 37 usec the HD44780 needs per command or data byte.
+        if self.tx_len:
+            self.i2c_send(self.tx_views[self.tx_len >> 2])
+            self.tx_len = 0
+
+    def queue_byte(self, value, mode):
+        # Queue the two nibbles of a byte, each strobed on E, with mode
+        # being MASK_RS for data or 0 for a command. A full buffer is sent
+        # early, which only splits the batch in two transfers.
+        if self.tx_len == TX_BUF_SIZE:
+            self.hal_flush()
+        buf = self.tx_buf
+        i = self.tx_len
+        byte = (mode |
                 (self.backlight << SHIFT_BACKLIGHT) |
-                (((data >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        byte = (MASK_RS |
+                (((value >> 4) & 0x0f) << SHIFT_DATA))
+        buf[i] = byte | MASK_E
+        buf[i + 1] = byte
+        byte = (mode |
                 (self.backlight << SHIFT_BACKLIGHT) |
-                ((data & 0x0f) << SHIFT_DATA))      
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        #gc.collect()
+                ((value & 0x0f) << SHIFT_DATA))
+        buf[i + 2] = byte | MASK_E
+        buf[i + 3] = byte
+        self.tx_len = i + 4
+
+    def wait_ready(self):
+        # Poll the HD44780 busy flag until the controller is ready. With RW
+        # high and P4-P7 left high the LCD drives D4-D7, and the busy flag
+        # (D7) is read on P7 during the first of the two E strobes of a
+        # 4-bit read. Returns False, and turns busy_poll off, if the flag
+        # can't be read or never clears.
+        rd = (MASK_RW | (self.backlight << SHIFT_BACKLIGHT) |
+              (0x0f << SHIFT_DATA))
+        strobe = self.strobe_buf
+        strobe[0] = rd
+        strobe[1] = rd | MASK_E
+        strobe[2] = rd
+        start = utime.ticks_us()
+        try:
+            while True:
+                self.write_byte(rd | MASK_E)
+                self.i2c.readfrom_into(self.i2c_addr, self.byte_buf)
+                self.rx_bytes += 1
+                busy = self.byte_buf[0] & 0x80
+                # Second strobe clocks out the low nibble of the address
+                self.i2c_send(strobe)
+                if not busy or (utime.ticks_diff(utime.ticks_us(), start) >
+                                BUSY_TIMEOUT_US):
+                    # Drop RW on its own before the next write raises E;
+                    # the HD44780 needs RW settled ahead of the E edge.
+                    self.write_byte(self.backlight << SHIFT_BACKLIGHT)
+                    if not busy:
+                        return True
+                    break
+        except OSError:
+            pass
+        self.busy_poll = False
+        return False
+
+    def write_byte(self, byte):
+        # Send a single byte straight to the PCF8574 outputs
+        self.byte_buf[0] = byte
+        self.i2c_send(self.byte_buf)
+
+    def i2c_send(self, buf):
+        # Single point where bytes leave for the PCF8574, counted so that
+        # bus usage can be measured against a stand-in I2C object.
+        self.i2c.writeto(self.i2c_addr, buf)
+        self.tx_bytes += len(buf)
+        self.tx_count += 1
+
+    def reset_counters(self):
+        # Zero the byte and transaction counters
+        self.tx_bytes = 0
+        self.tx_count = 0
+        self.rx_bytes = 0
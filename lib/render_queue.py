@@ -0,0 +1,152 @@
+import utime
+from machine import Timer
+
+
+class RenderQueue:
+    """Deferred LCD writes, drained to the display at a capped frame rate.
+
+    It offers the write side of LcdApi (clear, write_line,
+    write_line_center, clear_line, custom_char(s)) but only updates RAM and
+    marks the lines it touched, so control code never waits on I2C. The
+    first write after a frame arms a one-shot timer for the next frame,
+    at most max_fps times per second; that frame diffs each dirty line
+    against the LCD shadow copy and sends what changed. Everything written
+    in between is merged, so a burst of redraws shows only its final state.
+    """
+
+    def __init__(self, lcd, max_fps=25):
+        self.lcd = lcd
+        self.num_lines = lcd.num_lines
+        self.num_columns = lcd.num_columns
+        self.frame_ms = 1000 // max_fps
+        self.frame = bytearray(lcd.shadow)
+        self.dirty = 0          # one bit per line waiting to be sent
+        self.glyphs = [None] * 8
+        self.glyph_dirty = 0    # one bit per CGRAM slot waiting to be sent
+        self.timer = None
+        self.drain_cb = self._drain     # bound once, not on every frame
+        self.running = False
+        self.pending = False    # a frame is scheduled
+        self.last_frame = utime.ticks_ms()
+        # Statistics: frames sent and writes merged into them
+        self.frames = 0
+        self.posts = 0
+
+    def start(self):
+        """Send queued writes in the background."""
+        if self.timer is None:
+            self.timer = Timer()
+        self.running = True
+        self.pending = False
+        if self.dirty or self.glyph_dirty:
+            self._schedule()
+
+    def stop(self):
+        """Stop the background frames and send what is pending."""
+        self.running = False
+        if self.timer is not None:
+            self.timer.deinit()
+        self.pending = False
+        self.flush()
+
+    def _post(self):
+        # Called after each write, schedules a frame if none is pending
+        self.posts += 1
+        if self.running and not self.pending:
+            self._schedule()
+
+    def _schedule(self):
+        self.pending = True
+        wait = self.frame_ms - utime.ticks_diff(utime.ticks_ms(), self.last_frame)
+        self.timer.init(period=wait if wait > 0 else 1, mode=Timer.ONE_SHOT,
+                        callback=self.drain_cb)
+
+    def _drain(self, timer):
+        self.pending = False
+        self.flush()
+
+    def flush(self):
+        """Send all pending lines to the LCD."""
+        # The dirty bits are taken before the frame is read, so a write cut
+        # short by the drain marks its line again and is sent next time.
+        # Glyphs go first so that new characters never show an old bitmap.
+        # Consecutive glyphs are uploaded together, in a single transfer.
+        dirty = self.glyph_dirty
+        self.glyph_dirty = 0
+        slot = 0
+        while dirty:
+            if dirty & 1:
+                first = slot
+                while dirty & 2:
+                    dirty >>= 1
+                    slot += 1
+                self.lcd.custom_chars(self.glyphs[first:slot + 1], first)
+            dirty >>= 1
+            slot += 1
+        dirty = self.dirty
+        self.dirty = 0
+        self.last_frame = utime.ticks_ms()
+        self.frames += 1
+        line = 1
+        while dirty:
+            if dirty & 1:
+                self.lcd.update_line(self.frame, line)
+            dirty >>= 1
+            line += 1
+
+    def custom_char(self, location, charmap):
+        """Queue a bitmap for one of the 8 CGRAM locations."""
+        location &= 0x7
+        self.glyphs[location] = charmap
+        self.glyph_dirty |= 1 << location
+        self._post()
+
+    def custom_chars(self, charmaps, location=0):
+        """Queue bitmaps for consecutive CGRAM locations."""
+        location &= 0x7
+        for n in range(min(len(charmaps), 8 - location)):
+            self.glyphs[location + n] = charmaps[n]
+            self.glyph_dirty |= 1 << (location + n)
+        self._post()
+
+    def displays(self, code):
+        """True if character code is shown or about to be shown."""
+        for cell in self.frame:
+            if cell == code:
+                return True
+        return self.lcd.displays(code)
+
+    def clear(self):
+        """Blank the whole display."""
+        frame = self.frame
+        for i in range(len(frame)):
+            frame[i] = 0x20
+        self.dirty = (1 << self.num_lines) - 1
+        self._post()
+
+    def write_line(self, string, line, pos=1):
+        """Queue string for the specified line and position."""
+        y = line - 1
+        if not 0 <= y < self.num_lines:
+            return
+        frame = self.frame
+        row = y * self.num_columns
+        x = pos - 1
+        for char in string:
+            if 0 <= x < self.num_columns:
+                frame[row + x] = ord(char) & 0xff
+            x += 1
+        self.dirty |= 1 << y
+        self._post()
+
+    def write_line_center(self, string, line):
+        """Queue string for the center of the specified line."""
+        pos = (self.num_columns - len(string)) //2
+        self.write_line(string, line, pos+1)
+
+    def clear_line(self, line):
+        """Queue a blank line"""
+        self.write_line(' ' * self.num_columns, line)
+
+
+############### END OF CLASS ################
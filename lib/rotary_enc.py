@@ -7,9 +7,9 @@
 # Documentation:
 #   https://github.com/MikeTeachman/micropython-rotary
 
-from machine import Pin
+from machine import Pin, disable_irq, enable_irq
 from micropython import const
-from utime import sleep, sleep_ms, sleep_us
+from utime import sleep, sleep_ms, sleep_us, ticks_ms, ticks_diff
 
 # Rotary Encoder States
 _DIR_CW = const(0x10)  # Clockwise step
@@ -64,22 +64,47 @@ _DIR_MASK = const(0x30)
 
 class Rotary:
 
-    def __init__(self, sw_pin, clk_pin, dt_pin, half_step = True):
+    def __init__(self, sw_pin, clk_pin, dt_pin, half_step = True, irq = False):
         self._sw_pin = Pin(sw_pin, Pin.IN, Pin.PULL_DOWN)
         self._clk_pin = Pin(clk_pin, Pin.IN, Pin.PULL_DOWN)
         self._dt_pin = Pin(dt_pin, Pin.IN, Pin.PULL_DOWN)
         self._half_step = half_step
         self._state = _R_START
-        self._value = 0
+        self._value = 0     # steps accumulated by the IRQ, not yet read
+        self._accel = 0     # the same steps, scaled by the curve
+        self._curve = ()
+        self._last_ms = ticks_ms()
+        self._irq = irq
+        if irq:
+            # Run the transition table on every clk/dt edge, so that no
+            # transition is missed while the UI is busy (LCD redraws).
+            # The bound method is made once, the IRQ can't allocate.
+            handler = self._process_pins
+            trigger = Pin.IRQ_RISING | Pin.IRQ_FALLING
+            self._clk_pin.irq(handler=handler, trigger=trigger, hard=True)
+            self._dt_pin.irq(handler=handler, trigger=trigger, hard=True)
     
     def reset(self):
         self._value = 0
+        self._accel = 0
+
+    def set_curve(self, curve = None):
+        # Acceleration for delta(): a tuple of (interval ms, multiplier),
+        # shortest interval first. A detent made less than interval ms after
+        # the previous one counts multiplier times; None or () for none.
+        self._curve = curve or ()
+        self.reset()
 
     def select(self):
         return self._sw_pin.value() 
 
-    
-    def value(self):
+    def sw_pin(self):
+        # Pin of the select switch, for an event source such as
+        # buttons.SelectSwitch
+        return self._sw_pin
+
+    def _step(self):
+        # Run the transition table on the pin levels, return the step made
         clk_dt_pin = (self._clk_pin.value() << 1) | self._dt_pin.value()
         if self._half_step:
             self._state = _transition_table_half_step[self._state & _STATE_MASK][clk_dt_pin]
@@ -96,6 +121,55 @@ class Rotary:
             incr = -1
             
         return incr
+
+    def _process_pins(self, pin):
+        # clk/dt IRQ handler, times the detents to scale them by the curve
+        incr = self._step()
+        if incr:
+            now = ticks_ms()
+            interval = ticks_diff(now, self._last_ms)
+            self._last_ms = now
+            self._value += incr
+            for max_ms, multiplier in self._curve:
+                if interval < max_ms:
+                    incr *= multiplier
+                    break
+            self._accel += incr
+    
+    def value(self):
+        # One step: 1 clockwise, -1 counter-clockwise, 0 if none. With irq,
+        # steps are taken one at a time from those accumulated; without,
+        # the pins are sampled now.
+        if not self._irq:
+            return self._step()
+        incr = 0
+        irq_state = disable_irq()
+        if self._value > 0:
+            incr = 1
+        elif self._value < 0:
+            incr = -1
+        self._value -= incr
+        self._accel = 0
+        enable_irq(irq_state)
+        return incr
+
+    def steps(self):
+        # All the steps accumulated by the IRQ since the last call, signed
+        irq_state = disable_irq()
+        steps = self._value
+        self._value = 0
+        self._accel = 0
+        enable_irq(irq_state)
+        return steps
+
+    def delta(self):
+        # Like steps(), scaled by the acceleration curve of set_curve()
+        irq_state = disable_irq()
+        steps = self._accel
+        self._value = 0
+        self._accel = 0
+        enable_irq(irq_state)
+        return steps
     
 ########## END OF CLASS ################
 
@@ -0,0 +1,97 @@
+class Screen:
+    """Declarative LCD screen made of static text and named field slots.
+
+    Each line is a template such as "I DC: {amp:>5.1f} A". The static text
+    is laid out and centred once, when the screen is built; afterwards
+    set() re-renders only the slot of one field. Every field needs a width
+    in its format spec so that the layout never moves. A line given as ''
+    is blanked by show(), a line given as None is left alone. Fields that
+    are not on the screen are ignored, so callers need not check which
+    optional lines are shown.
+    """
+
+    def __init__(self, lcd, lines, center=True):
+        self.lcd = lcd
+        self.static = []
+        self.fields = {}
+        self.values = {}
+        for line, template in enumerate(lines, 1):
+            if template is None:
+                self.static.append(None)
+                continue
+            text, slots = self._parse(template)
+            pos = (lcd.num_columns - len(text)) // 2 if center else 0
+            if pos < 0:
+                pos = 0
+            self.static.append(' ' * pos + text +
+                               ' ' * (lcd.num_columns - pos - len(text)))
+            for name, col, width, fmt in slots:
+                self.fields[name] = (line, pos + col + 1, width, fmt)
+                self.values[name] = ' ' * width
+
+    def _parse(self, template):
+        # Split a template into its static text, with spaces in place of
+        # the fields, and a list of (name, column, width, format) slots.
+        text = ''
+        slots = []
+        i = 0
+        while True:
+            start = template.find('{', i)
+            if start < 0:
+                return text + template[i:], slots
+            end = template.find('}', start)
+            text += template[i:start]
+            name, _, spec = template[start + 1:end].partition(':')
+            width = self._width(spec)
+            if not width:
+                raise ValueError('field without width: ' + name)
+            slots.append((name, len(text), width, '{:' + spec + '}'))
+            text += ' ' * width
+            i = end + 1
+
+    def _width(self, spec):
+        # Width of a format spec: [[fill]align][sign][#][0][width]...
+        i = 0
+        if len(spec) > 1 and spec[1] in '<>^=':
+            i = 2
+        elif spec and spec[0] in '<>^=':
+            i = 1
+        while i < len(spec) and spec[i] in '+- #':
+            i += 1
+        j = i
+        while j < len(spec) and spec[j].isdigit():
+            j += 1
+        return int(spec[i:j]) if j > i else 0
+
+    def show(self):
+        """Draw the whole screen, static text and current field values."""
+        for line, text in enumerate(self.static, 1):
+            if text is None:
+                continue
+            for name, (f_line, col, width, _) in self.fields.items():
+                if f_line == line:
+                    text = text[:col - 1] + self.values[name] + text[col - 1 + width:]
+            self.lcd.write_line(text, line)
+
+    def set(self, name, value):
+        """Render value in the slot of field name, if it changed."""
+        if name in self.fields:
+            self._render(name, self.fields[name][3].format(value))
+
+    def clear(self, name):
+        """Blank the slot of field name."""
+        if name in self.fields:
+            self._render(name, '')
+
+    def _render(self, name, text):
+        line, col, width, _ = self.fields[name]
+        if len(text) < width:
+            text += ' ' * (width - len(text))
+        elif len(text) > width:
+            text = text[:width]
+        if text != self.values[name]:
+            self.values[name] = text
+            self.lcd.write_line(text, line, col)
+
+
+############### END OF CLASS ################
@@ -0,0 +1,287 @@
+import framebuf
+
+from lcd_api import LcdApi
+
+# SSD1306 control bytes, sent before a run of command or data bytes
+CTRL_CMD  = 0x00
+CTRL_DATA = 0x40
+
+# SSD1306 commands
+SET_DISP        = 0xAE  # | 1: display on
+SET_COL_ADDR    = 0x21
+SET_PAGE_ADDR   = 0x22
+
+# Cell size in pixels; one 8x8 framebuf font character per cell
+CELL_W = 8
+
+# Glyphs of the HD44780 character ROM that the framebuf font lacks,
+# 5 pixel rows like CGRAM
+DEGREE = b'\x0c\x12\x12\x0c\x00\x00\x00\x00'
+BLOCK  = b'\x1f\x1f\x1f\x1f\x1f\x1f\x1f\x1f'
+
+class Ssd1306Lcd(LcdApi):
+    
+    # Implements a character display on a SSD1306 I2C OLED. The HD44780 is
+    # emulated in software (DDRAM, CGRAM, address counter, display shift) so
+    # that LcdApi and the code above it run unchanged. Characters are drawn
+    # in a framebuf and only the pages touched since the last push are sent.
+
+    def __init__(self, i2c, i2c_addr, num_lines, num_columns, width=128,
+                 height=64, geometry=None):
+        self.i2c = i2c
+        self.i2c_addr = i2c_addr
+        self.width = width
+        self.height = height
+        self.pages = height // 8
+        num_columns = min(num_columns, width // CELL_W)
+        num_lines = min(num_lines, height // 8)
+        self.cell_h = height // num_lines
+        self.fb_buf = bytearray(width * self.pages)
+        self.fb = framebuf.FrameBuffer(self.fb_buf, width, height,
+                                       framebuf.MONO_VLSB)
+        # Emulated controller state
+        self.ddram = bytearray(b' ' * 0x80)
+        self.cgram = bytearray(64)
+        self.ac = 0
+        self.in_cgram = False
+        self.increment = True
+        self.disp_shift = 0
+        self.two_lines = num_lines > 1
+        self.display_enabled = False
+        self.glyph_dirty = 0    # bit mask of CGRAM locations changed
+        self.page_dirty = 0     # bit mask of pages to push
+        self.col_lo = width     # column range to push in those pages
+        self.col_hi = 0
+        self.batch_depth = 0
+        # Preallocated transfers: page address command, then page data
+        self.cmd_buf = bytearray(2)
+        self.cmd_buf[0] = CTRL_CMD
+        self.addr_buf = bytearray((CTRL_CMD, SET_COL_ADDR, 0, width - 1,
+                                   SET_PAGE_ADDR, 0, 0))
+        fb_view = memoryview(self.fb_buf)
+        data = bytes((CTRL_DATA,))
+        self.fb_view = fb_view
+        self.page_vec = [data, None]
+        # Bus usage counters, see reset_counters()
+        self.tx_bytes = 0
+        self.tx_count = 0
+        self.i2c_send(bytes((
+            CTRL_CMD,
+            SET_DISP,           # off while configuring
+            0xD5, 0x80,         # clock divide ratio / oscillator
+            0xA8, height - 1,   # multiplex ratio
+            0xD3, 0x00,         # display offset
+            0x40,               # start line 0
+            0x8D, 0x14,         # charge pump on
+            0x20, 0x00,         # horizontal addressing mode
+            0xA1,               # column 127 mapped to SEG0
+            0xC8,               # scan COM[N-1] to COM0
+            0xDA, 0x12 if height == 64 else 0x02,   # COM pins
+            0x81, 0xCF,         # contrast
+            0xD9, 0xF1,         # precharge period
+            0xDB, 0x40,         # VCOMH deselect level
+            0xA4,               # display follows RAM
+            0xA6,               # not inverted
+            )))
+        LcdApi.__init__(self, num_lines, num_columns, geometry)
+
+    def write_cmd(self, cmd):
+        # Send a single command byte to the SSD1306
+        self.cmd_buf[1] = cmd
+        self.i2c_send(self.cmd_buf)
+
+    def hal_backlight_on(self):
+        # An OLED has no backlight, the panel is switched instead
+        self.write_cmd(SET_DISP | self.display_enabled)
+
+    def hal_backlight_off(self):
+        #Allows the hal layer to turn the backlight off
+        self.write_cmd(SET_DISP)
+
+    def hal_write_command(self, cmd):
+        # Run a HD44780 command on the emulated controller
+        if cmd & self.LCD_DDRAM:
+            self.ac = cmd & 0x7f
+            self.in_cgram = False
+        elif cmd & self.LCD_CGRAM:
+            self.ac = cmd & 0x3f
+            self.in_cgram = True
+        elif cmd & self.LCD_FUNCTION:
+            pass
+        elif cmd & self.LCD_MOVE:
+            step = 1 if cmd & self.LCD_MOVE_RIGHT else -1
+            if cmd & self.LCD_MOVE_DISP:
+                self.disp_shift = (self.disp_shift - step) % 40
+                self.redraw()
+            else:
+                self.step_ac(step)
+        elif cmd & self.LCD_ON_CTRL:
+            # The cursor is not drawn
+            self.display_enabled = bool(cmd & self.LCD_ON_DISPLAY)
+            self.write_cmd(SET_DISP | (self.display_enabled and self.backlight))
+        elif cmd & self.LCD_ENTRY_MODE:
+            self.increment = bool(cmd & self.LCD_ENTRY_INC)
+        elif cmd & self.LCD_HOME:
+            self.ac = 0
+            self.in_cgram = False
+            if self.disp_shift:
+                self.disp_shift = 0
+                self.redraw()
+        elif cmd & self.LCD_CLR:
+            ddram = self.ddram
+            for i in range(len(ddram)):
+                ddram[i] = 0x20
+            self.ac = 0
+            self.in_cgram = False
+            self.increment = True
+            self.disp_shift = 0
+            self.fb.fill(0)
+            self.page_dirty = (1 << self.pages) - 1
+            self.col_lo = 0
+            self.col_hi = self.width
+        if not self.batch_depth:
+            self.hal_flush()
+
+    def hal_write_data(self, data):
+        # Write to the emulated DDRAM or CGRAM and draw the cell it shows in
+        if self.in_cgram:
+            self.cgram[self.ac] = data & 0x1f
+            self.glyph_dirty |= 1 << (self.ac >> 3)
+            self.ac = (self.ac + (1 if self.increment else -1)) & 0x3f
+        else:
+            addr = self.ac
+            self.ddram[addr] = data
+            self.step_ac(1 if self.increment else -1)
+            self.draw_addr(addr)
+        if not self.batch_depth:
+            self.hal_flush()
+
+    def hal_batch_begin(self):
+        # Keep drawing in the framebuf until the matching hal_batch_end
+        self.batch_depth += 1
+
+    def hal_batch_end(self):
+        # Push the pages drawn since the outermost hal_batch_begin
+        self.batch_depth -= 1
+        if not self.batch_depth:
+            self.hal_flush()
+
+    def hal_flush(self):
+        # Redraw the cells showing a changed CGRAM glyph, then send the
+        # dirty columns of the dirty pages, each page as an address command
+        # and one transfer of data.
+        if self.glyph_dirty:
+            ddram = self.ddram
+            for y in range(self.num_lines):
+                for x in range(self.num_columns):
+                    code = ddram[self.visible_addr(x, y)]
+                    if code < 8 and self.glyph_dirty & (1 << code):
+                        self.draw_cell(x, y, code)
+            self.glyph_dirty = 0
+        if not self.page_dirty:
+            return
+        lo = self.col_lo
+        hi = self.col_hi
+        addr = self.addr_buf
+        addr[2] = lo
+        addr[3] = hi - 1
+        vec = self.page_vec
+        for p in range(self.pages):
+            if self.page_dirty & (1 << p):
+                addr[5] = p
+                addr[6] = p
+                self.i2c_send(addr)
+                start = p * self.width
+                vec[1] = self.fb_view[start + lo:start + hi]
+                self.i2c.writevto(self.i2c_addr, vec)
+                self.tx_bytes += 1 + hi - lo
+                self.tx_count += 1
+        self.page_dirty = 0
+        self.col_lo = self.width
+        self.col_hi = 0
+
+    def step_ac(self, step):
+        # Same counter wrap as the HD44780, see LcdApi.advance_addr
+        ac = self.ac + step
+        if self.two_lines:
+            if ac == 0x28:
+                ac = 0x40
+            elif ac == 0x68:
+                ac = 0x00
+            elif ac == 0x3f:
+                ac = 0x27
+            elif ac == -1:
+                ac = 0x67
+        else:
+            ac %= 0x50
+        self.ac = ac
+
+    def visible_addr(self, x, y):
+        # DDRAM address shown at column x of line y, display shift applied
+        base = self.row_offsets[y]
+        if not self.two_lines:
+            return (base + self.disp_shift + x) % 0x50
+        start = base & 0x40
+        return start + (base - start + self.disp_shift + x) % 40
+
+    def draw_addr(self, addr):
+        # Draw the cell, if any, that shows DDRAM address addr
+        for y in range(self.num_lines):
+            base = self.row_offsets[y]
+            if self.two_lines:
+                if (addr ^ base) & 0x40:
+                    continue
+                x = (addr - base - self.disp_shift) % 40
+            else:
+                x = (addr - base - self.disp_shift) % 0x50
+            if x < self.num_columns:
+                self.draw_cell(x, y, self.ddram[addr])
+
+    def draw_cell(self, x, y, code):
+        # Draw character code in the cell at column x, line y
+        fb = self.fb
+        px = x * CELL_W
+        py = y * self.cell_h
+        fb.fill_rect(px, py, CELL_W, self.cell_h, 0)
+        top = py + (self.cell_h - 8) // 2
+        if code < 8:
+            rows = memoryview(self.cgram)[code * 8:code * 8 + 8]
+        elif code == 0xff:
+            rows = BLOCK
+        elif code == 0xdf:
+            rows = DEGREE
+        else:
+            fb.text(chr(code), px, top, 1)
+            rows = None
+        if rows is not None:
+            # 5x8 glyph, centred in the 8 pixel wide cell
+            for row in range(8):
+                bits = rows[row]
+                for col in range(5):
+                    if bits & (0x10 >> col):
+                        fb.pixel(px + 1 + col, top + row, 1)
+        first = py >> 3
+        last = (py + self.cell_h - 1) >> 3
+        self.page_dirty |= ((1 << (last + 1)) - 1) & ~((1 << first) - 1)
+        if px < self.col_lo:
+            self.col_lo = px
+        if px + CELL_W > self.col_hi:
+            self.col_hi = px + CELL_W
+
+    def redraw(self):
+        # Draw every cell again, after a display shift
+        for y in range(self.num_lines):
+            for x in range(self.num_columns):
+                self.draw_cell(x, y, self.ddram[self.visible_addr(x, y)])
+
+    def i2c_send(self, buf):
+        # Single point where bytes leave for the SSD1306, counted so that
+        # bus usage can be measured against a stand-in I2C object.
+        self.i2c.writeto(self.i2c_addr, buf)
+        self.tx_bytes += len(buf)
+        self.tx_count += 1
+
+    def reset_counters(self):
+        # Zero the byte and transaction counters
+        self.tx_bytes = 0
+        self.tx_count = 0
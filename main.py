@@ -10,12 +10,21 @@ from machine import Pin, I2C, ADC, Timer
 import machine
 import utime
 import ujson
+import uasyncio as asyncio
 #import micropython
 import gc
 from lcd_api import LcdApi
 from pico_i2c_lcd import I2cLcd
 from menu import Menu
+from screen import Screen
+from render_queue import RenderQueue
+from glyphs import GlyphCache, bar
 from rotary_enc import Rotary
+from edge_ring import EdgeInputs
+from debouncer import Debouncer, BounceLearner
+from latency import LatencyMonitor
+from fsm import StateMachine
+from buttons import RepeatButton, SelectSwitch, CLICK, LONG_PRESS
 from math import sqrt
 
 ### default times if not config file not found
@@ -77,9 +86,26 @@ rotary_sw = Rotary(
     sw_pin = 9,     # select bouton, used to be Prog pin
     clk_pin = 15,    # signal A, used to be Up pin
     dt_pin = 16,      # signal B, used to be Down pin
-    half_step = False
+    half_step = False,
+    irq = True        # decode in the pin IRQs, steps wait for the menus
     )
 
+### encoder acceleration when editing a value, by parameter:
+### (detent interval ms, multiplier), shortest interval first
+ACCEL_FAST = ((30, 100), (80, 10))     # 0-999 ranges and 0.001 steps
+ACCEL_MEDIUM = ((50, 10),)
+ACCEL_CURVES = {
+    'Opn1'      : ACCEL_FAST,
+    'Cls'       : ACCEL_FAST,
+    'Mid'       : ACCEL_FAST,
+    'Opn2'      : ACCEL_FAST,
+    'btn_dura'  : ACCEL_FAST,
+    'V0_ref'    : ACCEL_FAST,
+    'N_lect'    : ACCEL_MEDIUM,
+    'Fcteur'    : ACCEL_MEDIUM,
+    'V_max'     : ACCEL_MEDIUM
+    }
+
 Timers = {}
 Current = {}
 Temp = {}
@@ -90,17 +116,21 @@ current_sensor = ADC(1)    # read curent at ADC(0)
 temp_sensor = ADC(2)      # read temperature at ADC(1)
 machine.freq(133000000)   # set cpu frequency
 
-current_timer = Timer()
-#temp_timer = Timer()
-stopled_timer = Timer()
+debounce_timer = Timer()
 
 ### some global variables
-state = 0
-stop_request = False
+stop_request = asyncio.Event()        # stop the door, or leave the menus, and initialize
+stop_flag = asyncio.ThreadSafeFlag()  # Stop input rose, set from its handler
+current_sampling = asyncio.Event()    # door moving, read the current
+countdown_done = asyncio.Event()      # the door waited long enough
+pulse_task = None                     # output pulse of the door cycle
+countdown_task = None                 # countdown of the door cycle
 stop_token_first = False  # used to turn off stop_request signal
 is_running = False
 in_prog_mode = False
 very_first_run = True
+run_screen = None
+latency = LatencyMonitor()   # limit switch to output pulse timings
 
 
 def load_file(file):
@@ -131,26 +161,35 @@ except OSError:
 I2C_ADDR     = 0x27
 I2C_NUM_ROWS = Parametres['LCD_li']
 I2C_NUM_COLS = Parametres['LCD_co']
+LCD_MAX_FPS  = 25        # at most this many LCD refreshes per second
 i2c = I2C(0, sda=Pin(0), scl=Pin(1), freq=400000)
-lcd = I2cLcd(i2c, I2C_ADDR, I2C_NUM_ROWS, I2C_NUM_COLS)
+# all screen writes are queued and merged into capped-rate background frames
+lcd = RenderQueue(I2cLcd(i2c, I2C_ADDR, I2C_NUM_ROWS, I2C_NUM_COLS, busy_poll=True), LCD_MAX_FPS)
+lcd.start()
+glyph_cache = GlyphCache(lcd)
 
 prog_mode_delay = 2                         # delay for press and hold before entre prog mode
-delay_readPin = 1        # delay between each iteration to read pin
+delay_readPin = 1        # msec of stability time per btn_lect count
+DEBOUNCE_MIN_MS = 1      # bounds of the debounce windows learned per input
+DEBOUNCE_MAX_MS = 30
+DOOR_POLL_MS = 5         # task periods
+UI_POLL_MS = 10
+LEARN_POLL_MS = 50
+CURRENT_POLL_MS = 500
+TEMP_POLL_MS = 5000
 
-def initialize():
+async def initialize():
     """initialization before each run"""
-    global state
-    global stop_request
-    global stop_token_first
     global is_running
     global in_prog_mode
     global menu_current_line, menu_shift, menu_current_level
+    global run_screen
     
-    state = 0
+    door.state = ST_IDLE
     menu_current_line = menu_shift = menu_current_level = 0
-    stop_request = False
     is_running = False
     in_prog_mode = False
+    current_sampling.clear()
     
     for p in Output:
         if p != 'Stop':
@@ -158,6 +197,11 @@ def initialize():
         
     for p in Input:
         Input[p]        
+    select_sw.reset()        # drop the clicks made while running
+    # a level must hold btn_lect x delay_readPin msec to count
+    debouncer.set_stable(Parametres['btn_lect'] * delay_readPin)
+    learner.apply()          # except for the inputs with a learned window
+    debouncer.forget()       # and the limits reached while stopped or idle
     ## make sure that open after mid-top is 0 if no mid-stop
     Timers['Opn2'] = 0 if Timers['Mid'] == 0 else Timers['Opn2']
     
@@ -165,127 +209,175 @@ def initialize():
     if very_first_run and Parametres['StopOut'] == 'N.OPN':
         Output['Stop'].value(1)
     
-    current_timer.deinit()
-    #temp_timer.deinit()
-    
     lcd.clear()
     lcd.write_line_center("HARMONIE V " + str(version), 1)
     lcd.write_line_center("BIENVENUE", 2)
-    utime.sleep(2)
+    await asyncio.sleep(2)
     lcd.clear()
-    lcd.write_line_center("Cls:{0:>3},Opn1:{1:>3}".format(Timers['Cls'], Timers['Opn1']), 1)
-    lcd.write_line_center("Mid:{0:>3},Opn2:{1:>3}".format(Timers['Mid'], Timers['Opn2']), 2)
+    banner = Screen(lcd, ('Cls:{cls:>3},Opn1:{opn1:>3}', 'Mid:{mid:>3},Opn2:{opn2:>3}'))
+    banner.set('cls', Timers['Cls'])
+    banner.set('opn1', Timers['Opn1'])
+    banner.set('mid', Timers['Mid'])
+    banner.set('opn2', Timers['Opn2'])
+    banner.show()
     
-def readPin(pin, counter = Parametres['btn_lect'] , delay = delay_readPin):
-    """Read pin a number of times to determine good signal, delay in msec"""
-    read_count = 0
-    
-    for i in range(counter):
-        if Input[pin].value():
-            read_count += 1
-        utime.sleep_ms(delay)
-            
-    if read_count == counter:
-        return True
+    # screen shown while the door cycles, only the fields change per tick
+    run_screen = Screen(lcd, (
+        '{etat:^13}',
+        '{sens:<10}{count:>3}',
+        'I DC: {amp:>5.1f} A' if Current['Statut'] == 'Active' else '',
+        # line 4 shows the temperature, or else a countdown / current bar graph
+        'Temp: {temp:>5.1f} ' + chr(223) + 'C' if Temp['Statut'] == 'Active'
+            else '{bar:<' + str(I2C_NUM_COLS) + '}'
+        ))
+    # the stop requests made meanwhile are done with
+    stop_request.clear()
     
-    return False
+def readPin(pin):
+    """Debounced pin level, kept up to date by the debounce timer"""
+    return debouncer.value(pin) == 1
 
-def writePin(pin, delay, perm_counter = False, LimitOn = None):
-    """Write high value to pin, pause in ms"""
+async def writePin(pin, delay, perm_counter = False, LimitOn = None, dwell = 0,
+                   sample = True, previous = None):
+    """Write high value to pin, pause in ms. The time from the LimitOn edge
+    to the pulse, less the dwell countdown in sec, is kept in latency.
+    The pulse waits for the previous pulse task to end, so that two relays
+    are never on together, then starts reading current if sample"""
+    
+    if previous is not None:
+        try:
+            await previous
+        except asyncio.CancelledError:
+            # A previous pulse that a stop cancelled already is over. If it
+            # is still on, this task is the one cancelled: end both.
+            if not previous.done():
+                previous.cancel()
+                raise
      
-    if not stop_request:
+    pulse_start = None
+    counter = False
+    if not stop_request.is_set():
         if pin in ['Open', 'Counter'] and Input['OpenLmt'].value() != 1:
             if Parametres['Compteur'] == 'ClsLmt'  and perm_counter == True and LimitOn == 'CloseLmt':
                 Output['Counter'].value(1)
+                counter = True
             Output[pin].value(1)
-            lcd.clear_line(1)
-            lcd.clear_line(2)
-            lcd.write_line_center("EN OUVERTURE ", 1)
+            pulse_start = utime.ticks_us()
+            run_screen.set('etat', "EN OUVERTURE")
+            run_screen.clear('sens')
+            run_screen.clear('count')
+            run_screen.clear('bar')
         elif pin == 'Close' and Input['CloseLmt'].value() != 1:
             if Parametres['Compteur'] == 'OpnLmt' and perm_counter == True and LimitOn == 'OpenLmt':
                 Output['Counter'].value(1)
+                counter = True
             Output[pin].value(1)
-            lcd.clear_line(1)
-            lcd.clear_line(2)
-            lcd.write_line_center("EN FERMETURE ", 1)
+            pulse_start = utime.ticks_us()
+            run_screen.set('etat', "EN FERMETURE")
+            run_screen.clear('sens')
+            run_screen.clear('count')
+            run_screen.clear('bar')
         
-        utime.sleep_ms(delay)
-        Output[pin].value(0)
-        Output['Counter'].value(0)
+        try:
+            await asyncio.sleep_ms(delay)
+        finally:            # a stop cancels the pulse, never leave it high
+            if pulse_start is not None:
+                Output[pin].value(0)
+            if counter:
+                Output['Counter'].value(0)
+        if LimitOn and pulse_start is not None:
+            latency.record(LimitOn + '>' + pin, inputs.rise_us(LimitOn),
+                           pulse_start, utime.ticks_us(), dwell * 1000)
         
     # start reading current
-    if Current['Statut'] == 'Active':
-        current_timer.init(freq=2 , mode=Timer.PERIODIC, callback=read_current)
+    if sample and Current['Statut'] == 'Active':
+        current_sampling.set()
 
-def lcd_count_down(duration):
-    """count down in second"""
-    global stop_request
-    msg = ''
-    
-    # stop reading current
-    current_timer.deinit()
-    
-    if state == 1 or state == 3: # clsLmt activated, door will open
-        msg = "OUVERTURE:"
-    elif state == 2 or state == 4: # opnLmt activated, door will close
-        msg = "FERMETURE:"
-    
+async def lcd_count_down(duration, msg):
+    """count down in second, then set countdown_done"""
+    run_screen.set('sens', msg)
+    show_bar = 'bar' in run_screen.fields
     for i in  range(duration, 0, -1):
-        lcd.write_line_center("{0}{1:>3}".format(msg, i), 2)
-        if stop_request:
-            break
-        elif state == 3 and Input['CloseLmt'].value():
-            break
-        utime.sleep(1)
+        run_screen.set('count', i)
+        if show_bar:
+            run_screen.set('bar', bar(glyph_cache, (duration - i) / duration, I2C_NUM_COLS))
+        await asyncio.sleep(1)
+    countdown_done.set()
 
+def cancel_count_down():
+    """Cancel the countdown under way"""
+    if countdown_task is not None:
+        countdown_task.cancel()
 
-def stopled_off(timer):
-    """Turn off stop led and signal when stop button is declicked."""
-    
-    global stop_request, stop_token_first, very_first_run
-    
-    very_first_run = False
-    
-    if Input['Stop'].value() == 0 and stop_token_first:
-        if Parametres['StopOut'] == 'N.OPN':
-            Output['Stop'].value(1)
-        else:
-            Output['Stop'].value(0)
+def cancel_door_tasks():
+    """Cancel the pulse and countdown under way"""
+    global pulse_task, countdown_task
+    if pulse_task is not None:
+        pulse_task.cancel()
+    cancel_count_down()
+    pulse_task = None
+    countdown_task = None
 
+def pulse(pin, perm_counter = False, LimitOn = None, dwell = 0, sample = True):
+    """Pulse output pin for btn_dura msec, beside the other tasks, after the
+    pulse under way. Returns the pulse task"""
+    global pulse_task
+    pulse_task = asyncio.create_task(
+        writePin(pin, Parametres['btn_dura'], perm_counter, LimitOn, dwell,
+                 sample, pulse_task))
+    return pulse_task
 
-        stop_token_first = False
-        stopled_timer.deinit()
+def count_down(duration, msg):
+    """Stop reading current and count duration sec down, EV_TIMEOUT follows"""
+    global countdown_task
+    current_sampling.clear()
+    run_screen.clear('amp')
+    countdown_done.clear()
+    countdown_task = asyncio.create_task(lcd_count_down(duration, msg))
 
-def stop_signal_handler(pin):
-    """Send stop_request when activate"""
+async def stop_task():
+    """Confirm the Stop input, request the stop, and turn off the stop
+    signal when the button is released"""
+    global stop_token_first, very_first_run
     
-    read_count = 0
-    global stop_token_first, stop_request
-    current_timer.deinit()
-    
-    stopled_timer.init(freq=10, mode=Timer.PERIODIC, callback=stopled_off)
-    
-    for i in range(Parametres['btn_lect'] ):
-        if Input['Stop'].value():
-            read_count += 1
-        utime.sleep_ms(delay_readPin)
+    while True:
+        await stop_flag.wait()
+        if stop_token_first:
+            continue
         
-    if (read_count == Parametres['btn_lect'] ) and stop_token_first == False: 
-        stop_token_first = True
-        stop_request = True
+        read_count = 0
+        for i in range(Parametres['btn_lect'] ):
+            if Input['Stop'].value():
+                read_count += 1
+            await asyncio.sleep_ms(delay_readPin)
+        if read_count != Parametres['btn_lect']:
+            continue
         
+        stop_token_first = True
+        very_first_run = False
         if Parametres['StopOut'] == 'N.OPN':
             Output['Stop'].value(0)
         else:
             Output['Stop'].value(1)
+        current_sampling.clear()
+        stop_request.set()
+        
+        # turn off stop led and signal when stop button is declicked
+        while Input['Stop'].value():
+            await asyncio.sleep_ms(100)
+        if Parametres['StopOut'] == 'N.OPN':
+            Output['Stop'].value(1)
+        else:
+            Output['Stop'].value(0)
+        stop_token_first = False
 
-    utime.sleep_ms(Parametres['btn_dura'])
+def stop_signal_handler(pin):
+    """Stop input rose, let stop_task confirm it"""
+    stop_flag.set()
 
-def read_current(timer):
+def read_current():
     """Read current in amp"""
     
-    global stop_request
-    
     counter = 0
     voltage = 0
     
@@ -297,85 +389,164 @@ def read_current(timer):
     
     amp = (voltage * Current['V_max']/65535  - Current['V0_ref']) * (1000/Current['Fcteur'])
     #amp = (max_voltage * Current['V_max']/65535 - 0.0245 - Current['V0_ref']) 
-    lcd.write_line_center("I DC: {0:>5.1f} A".format(amp), 3) 
+    run_screen.set('amp', amp)
+    if 'bar' in run_screen.fields:
+        amp_max = (Current['V_max'] - Current['V0_ref']) * (1000/Current['Fcteur'])
+        run_screen.set('bar', bar(glyph_cache, abs(amp) / amp_max, I2C_NUM_COLS))
+
+async def current_task():
+    """Read the current twice a second while the door moves"""
+    while True:
+        await current_sampling.wait()
+        read_current()
+        await asyncio.sleep_ms(CURRENT_POLL_MS)
 
 def read_temp():
     """Read temperature"""
      
     voltage = (Temp['V_max']/65535) * temp_sensor.read_u16()
     temp = (voltage - Temp['V0_ref']) * (1000/Temp['Fcteur'])
-    lcd.write_line_center('Temp: {0:>5.1f} '.format(temp) + chr(223) + 'C', 4)
+    run_screen.set('temp', temp)
+
+async def temp_task():
+    """Read the temperature every few seconds while the door cycles"""
+    while True:
+        if is_running and Temp['Statut'] == 'Active':
+            read_temp()
+        await asyncio.sleep_ms(TEMP_POLL_MS)
+
+async def input_task():
+    """Learn the bounce of the inputs from their captured edges"""
+    while True:
+        learner.poll()
+        await asyncio.sleep_ms(LEARN_POLL_MS)
+
+def door_close():
+    """Idle, Close pressed: close the door"""
+    pulse('Close')
 
-def Logic_loop():
+def door_open():
+    """Idle, Open pressed: open the door"""
+    pulse('Open')
+
+def door_closed():
+    """Door fully closed, close limit triggers: wait"""
+    global cycle_counter
+    cycle_counter += 1
+    run_screen.set('etat', "PORTE FERMEE")
+    count_down(Timers['Cls'], "OUVERTURE:")
+    gc.collect()        # force gc collection
+    #print(gc.mem_free())
+
+def door_reopen():
+    """Closed wait over: open"""
+    pulse('Open', perm_counter = True, LimitOn = 'CloseLmt', dwell = Timers['Cls'])
+
+def door_opened():
+    """Door fully opened, before mid-stop: wait"""
+    run_screen.set('etat', "PORTE OUVERTE")
+    count_down(Timers['Opn1'], "FERMETURE:")
+
+def door_reclose(sample = True):
+    """Opened wait over: close"""
+    return pulse('Close', perm_counter = True, LimitOn = 'OpenLmt',
+                 dwell = Timers['Opn1'], sample = sample)
+
+def midstop_due():
+    """Guard: this cycle stops half way"""
+    return cycle_counter > 0 and cycle_counter % Parametres['MidStop'] == 0
+
+def door_mid_stop():
+    """Opened wait over, mid-stop: close, and open again after the Mid wait"""
+    global countdown_task
+    close = door_reclose(sample = False)    # no current reading in mid-stop
+    current_sampling.clear()
+    countdown_done.clear()
+    countdown_task = asyncio.create_task(mid_stop_count_down(close))
+
+async def mid_stop_count_down(close):
+    """Let the close pulse end, then show the mid-stop and count Mid down"""
+    await close
+    run_screen.set('etat', "MI-ARRET")
+    run_screen.clear('amp')
+    await lcd_count_down(Timers['Mid'], "OUVERTURE:")
+
+def door_mid_stop_over():
+    """Mid-stop wait over, or door closed before: open again"""
+    cancel_count_down()
+    if Parametres['MdStpPin'] == 'OPEN':
+        pulse('Open')
+    else:
+        pulse('Counter')
+
+def door_opened_after_mid():
+    """Door fully opened, after mid-stop: wait"""
+    run_screen.set('etat', "PORTE OUVERTE")
+    count_down(Timers['Opn2'], "FERMETURE:")
+
+def door_reclose_after_mid():
+    """Opened wait after mid-stop over: close"""
+    pulse('Close', perm_counter = True, LimitOn ='OpenLmt', dwell = Timers['Opn2'])
+
+### door cycle
+# states
+ST_IDLE         = 0     # initial state
+ST_CLOSED       = 1     # waiting for the close limit
+ST_OPENED       = 2     # waiting for the open limit, before mid-stop
+ST_MIDSTOP      = 3     # mi-stop
+ST_OPENED2      = 4     # waiting for the open limit, after mid-stop
+ST_CLOSED_WAIT  = 5     # counting down, closed
+ST_OPENED_WAIT  = 6     # counting down, opened before mid-stop
+ST_OPENED2_WAIT = 7     # counting down, opened after mid-stop
+# events: an input that reads high, or EV_TIMEOUT at the end of a countdown
+DOOR_EVENTS = ('Close', 'Open', 'CloseLmt', 'OpenLmt', None)
+EV_CLOSE, EV_OPEN, EV_CLOSE_LMT, EV_OPEN_LMT, EV_TIMEOUT = range(len(DOOR_EVENTS))
+
+DOOR_CYCLE = (
+    # state           event         guard        action                  next state
+    (ST_IDLE,         EV_CLOSE,     None,        door_close,             ST_CLOSED),
+    (ST_IDLE,         EV_OPEN,      None,        door_open,              ST_OPENED),
+    (ST_CLOSED,       EV_CLOSE_LMT, None,        door_closed,            ST_CLOSED_WAIT),
+    (ST_CLOSED_WAIT,  EV_TIMEOUT,   None,        door_reopen,            ST_OPENED),
+    (ST_OPENED,       EV_OPEN_LMT,  None,        door_opened,            ST_OPENED_WAIT),
+    (ST_OPENED_WAIT,  EV_TIMEOUT,   midstop_due, door_mid_stop,          ST_MIDSTOP),
+    (ST_OPENED_WAIT,  EV_TIMEOUT,   None,        door_reclose,           ST_CLOSED),
+    (ST_MIDSTOP,      EV_CLOSE_LMT, None,        door_mid_stop_over,     ST_OPENED2),
+    (ST_MIDSTOP,      EV_TIMEOUT,   None,        door_mid_stop_over,     ST_OPENED2),
+    (ST_OPENED2,      EV_OPEN_LMT,  None,        door_opened_after_mid,  ST_OPENED2_WAIT),
+    (ST_OPENED2_WAIT, EV_TIMEOUT,   None,        door_reclose_after_mid, ST_CLOSED),
+    )
+
+door = StateMachine(8, len(DOOR_EVENTS), DOOR_CYCLE)
+cycle_counter = 0
+
+def door_event(event):
+    """Poll one door event"""
+    name = DOOR_EVENTS[event]
+    if name is None:
+        return countdown_done.is_set()
+    return readPin(name)
+
+async def door_task():
     """The main state logic. Core program"""
-    global state
-    global stop_request
     global is_running
+    global cycle_counter
     
-    cycle_counter = 0
-    
-    is_running = True
-    
-    while not stop_request:
-        
-        if state == 0:              # initial state
-            if readPin('Close'):
-                writePin('Close', Parametres['btn_dura'])
-                state = 1
-            elif readPin('Open'):
-                writePin('Open', Parametres['btn_dura'])
-                state = 2
-        elif state == 1:            # door fully closed, close limit triggers
-            if readPin('CloseLmt'):
-                current_timer.deinit()
-                cycle_counter += 1
-                lcd.clear_line(1)
-                lcd.clear_line(3)
-                lcd.write_line_center("PORTE FERMEE", 1)
-                
-                if Temp['Statut'] == 'Active':
-                    read_temp()    # read and show temperature
-                    
-                lcd_count_down(Timers['Cls'])
-                writePin('Open', Parametres['btn_dura'], perm_counter = True, LimitOn = 'CloseLmt')
-                state = 2
-                gc.collect()        # force gc collection
-                #print(gc.mem_free())
-        elif state == 2:            # door fully opened, before mid-stop
-            if readPin('OpenLmt'):
-                current_timer.deinit()
-                lcd.clear_line(1)
-                lcd.clear_line(3)
-                lcd.write_line_center("PORTE OUVERTE", 1)
-                lcd_count_down(Timers['Opn1'])
-                writePin('Close', Parametres['btn_dura'], perm_counter = True, LimitOn = 'OpenLmt')
-                state = 3 if cycle_counter > 0 and cycle_counter % Parametres['MidStop'] == 0 else 1
-        elif state == 3:             # mi-stop
-            current_timer.deinit()
-            lcd.clear_line(1)
-            lcd.clear_line(3)
-            lcd.write_line_center("MI-ARRET", 1)
-            lcd_count_down(Timers['Mid'])
-            
-            if Parametres['MdStpPin'] == 'OPEN':
-                writePin('Open', Parametres['btn_dura'])
-            else:
-                writePin('Counter', Parametres['btn_dura'])
-            
-            state = 4
-        elif state == 4:              # door fully opened, after mid-stop
-            if readPin('OpenLmt'):
-                current_timer.deinit()
-                lcd.clear_line(1)
-                lcd.clear_line(3)
-                lcd.write_line_center("PORTE OUVERTE", 1)
-                lcd_count_down(Timers['Opn2'])
-                writePin('Close', Parametres['btn_dura'], perm_counter = True, LimitOn ='OpenLmt')
-                state = 1
-        else:
-            print("ERREUR")
+    while True:
+        if not stop_request.is_set() and not in_prog_mode:
+            if is_running:
+                if door.step(door_event):
+                    # a new state only answers the edges seen from now on
+                    debouncer.forget()
+            elif not stop_token_first and door.step(door_event):
+                # Close or Open pressed, the cycle starts
+                debouncer.forget()
+                cycle_counter = 0
+                is_running = True
+                run_screen.show()
+        await asyncio.sleep_ms(DOOR_POLL_MS)
 
-def Config_Timers():
+async def Config_Timers():
     """Configuration for timers open/close and mid-stop"""
     global Timers, config
     is_value_modified = False
@@ -384,9 +555,9 @@ def Config_Timers():
     menu_values = Menu([Timers[k] for k in sorted(Timers)], I2C_NUM_ROWS)
     
     first_time = True
-    first_select = True
-    while not stop_request:
+    while not stop_request.is_set():
         sw_value = rotary_sw.value()
+        event = select_sw.event()
         delay_ms = 1
         if first_time:
             lcd.clear()
@@ -400,31 +571,24 @@ def Config_Timers():
 
             first_time = False
             
-        elif rotary_sw.select():
+        if event == LONG_PRESS:       # back to the main menu
+            break
+        elif event == CLICK:
             ### If the switch is clicked, go into change value mode
             
             value = menu_values.items[menu_key.current_line + menu_key.shift - 1]
             key = menu_key.items[menu_key.current_line + menu_key.shift - 1]
-            if not first_select:
-                is_value_modified = not is_value_modified
-                lcd.write_line('{:<5}:>> {:<8}'.format(key.upper(), value), menu_key.current_line, 1)
-            else:
-                first_select = False
+            is_value_modified = not is_value_modified
+            lcd.write_line('{:<5}:>> {:<8}'.format(key.upper(), value), menu_key.current_line, 1)
             
-            utime.sleep_ms(300)
             start_time = utime.ticks_ms()
-            while is_value_modified and not stop_request:
-                sw_value = rotary_sw.value()
+            rotary_sw.set_curve(ACCEL_CURVES.get(key))
+            while is_value_modified and not stop_request.is_set():
+                sw_value = rotary_sw.delta()    # detents, accelerated
+                step = max(abs(sw_value), 1)   # an Up/Down press counts 1
+                event = select_sw.event()
                 delay_ms = 1
-                if sw_value == 1 or readPin('Up'):         # turn clockwise
-                    if readPin('Up'): delay_ms = 200
-                    value += 1
-                    if value > 999: value = 0
-                elif sw_value == -1 or readPin('Down'):
-                    if readPin('Down'): delay_ms = 200
-                    value -= 1
-                    if value < 0: value = 999
-                elif rotary_sw.select():
+                if event == CLICK or event == LONG_PRESS:     # long press saves and leaves
                     Timers.update({key: value})
                     config['Timers'] = Timers
                     write_file(filename)
@@ -434,18 +598,27 @@ def Config_Timers():
                     menu_key.update(sorted(Timers))
                     menu_values.update([Timers[k] for k in sorted(Timers)])
                     is_value_modified = not is_value_modified
-                    utime.sleep_ms(300)
+                elif sw_value > 0 or btn_up.step():         # turn clockwise
+                    value += step
+                    if value > 999:     # a single step wraps, a fast turn stops
+                        value = value % 1000 if step == 1 else 999
+                elif sw_value < 0 or btn_down.step():
+                    value -= step
+                    if value < 0:
+                        value = value % 1000 if step == 1 else 0
                 
                 elapsed = utime.ticks_diff(utime.ticks_ms(), start_time)
                 if elapsed > 200:
                     lcd.write_line('{:<3}'.format(value), menu_key.current_line, 10)
                     start_time = utime.ticks_ms()
-                utime.sleep_ms(delay_ms)
+                await asyncio.sleep_ms(delay_ms)
+            rotary_sw.set_curve()
                 
             lcd.write_line('>> {:<5}: {:<8}'.format(key.upper(), value), menu_key.current_line, 1)                                   
+            if event == LONG_PRESS:
+                break
             
-        elif sw_value == 1 or readPin('Up'):
-            if readPin('Up'): delay_ms = 200
+        elif sw_value == 1 or btn_up.step():
             lcd.clear()
             line = 1
             for k, v in zip(menu_key.next(), menu_values.next()):
@@ -454,8 +627,7 @@ def Config_Timers():
                 else:
                     lcd.write_line('{:<5}: {:<8}'.format(k.upper(), v), line, 3)
                 line += 1
-        elif sw_value == -1 or readPin('Down'):
-            if readPin('Down'): delay_ms = 200
+        elif sw_value == -1 or btn_down.step():
             lcd.clear()
             line = 1
             for k, v in zip(menu_key.previous(), menu_values.previous()):
@@ -467,13 +639,10 @@ def Config_Timers():
                     lcd.write_line('{:<5}: {:<8}'.format(k.upper(), v), line, 3)
                 line += 1
         
-        utime.sleep_ms(delay_ms)
-    
-    # go back to Configuration menu
-    Configuration()
+        await asyncio.sleep_ms(delay_ms)
         
     
-def Config_Current():
+async def Config_Current():
     """Configuration for current sensor."""
     global Current, config
     is_value_modified = False
@@ -482,9 +651,9 @@ def Config_Current():
     menu_values = Menu([Current[k] for k in sorted(Current)], I2C_NUM_ROWS)
     
     first_time = True
-    first_select = True
-    while not stop_request:
+    while not stop_request.is_set():
         sw_value = rotary_sw.value()
+        event = select_sw.event()
         delay_ms = 10
         if first_time:
             lcd.clear()
@@ -497,80 +666,79 @@ def Config_Current():
                 line += 1
             first_time = False
             
-        elif rotary_sw.select():
+        if event == LONG_PRESS:       # back to the main menu
+            break
+        elif event == CLICK:
             ### If the switch is clicked, go into change value mode
             
             value = menu_values.items[menu_key.current_line + menu_key.shift - 1]
             key = menu_key.items[menu_key.current_line + menu_key.shift - 1]
             
-            if not first_select:
-                is_value_modified = not is_value_modified
-                lcd.write_line('{:<6}:>> {:<8}'.format(key.upper(), value), menu_key.current_line, 1)
-            else:
-                first_select = False
+            is_value_modified = not is_value_modified
+            lcd.write_line('{:<6}:>> {:<8}'.format(key.upper(), value), menu_key.current_line, 1)
 
-            utime.sleep_ms(250)
             value_format = ''
             start_time = utime.ticks_ms()
-            while is_value_modified and not stop_request:
-                sw_value = rotary_sw.value()
+            rotary_sw.set_curve(ACCEL_CURVES.get(key))
+            while is_value_modified and not stop_request.is_set():
+                sw_value = rotary_sw.delta()    # detents, accelerated
+                step = max(abs(sw_value), 1)   # an Up/Down press counts 1
+                event = select_sw.event()
                 delay_ms = 10
-                if sw_value == 1 or readPin('Up'):         # turn clockwise\
-                    if readPin('Up'): delay_ms = 200
+                if event == CLICK or event == LONG_PRESS:     # long press saves and leaves
+                    Current.update({key: value})
+                    config['Current'] = Current
+                    write_file(filename)
+                    load_file(filename)
+                    
+                    ## update menuitems
+                    menu_key.update(sorted(Current))
+                    menu_values.update([Current[k] for k in sorted(Current)])
+                    is_value_modified = not is_value_modified
+                elif sw_value > 0 or btn_up.step():         # turn clockwise\
                     if key in ['Statut']:
                         value = 'Active' if value == 'Inactiv' else 'Inactiv'
                         value_format = '{:<8}'
                     elif key in ['N_lect', 'Fcteur']:
-                        value += 1
+                        value += step
                         value_format = '{:<5}'
                     elif key in ['V_max']:
-                        value += 0.1
+                        value += 0.1 * step
                         value_format = '{:<5.1f}'
                     elif key in ['V0_ref']:
-                        value += 0.001
+                        value += 0.001 * step
                         value_format = '{:<6.3f}'
 
-                elif sw_value == -1 or readPin('Down'):
-                    if readPin('Down'): delay_ms = 200
+                elif sw_value < 0 or btn_down.step():
                     if key in ['Statut']:
                         value = 'Active' if value == 'Inactiv' else 'Inactiv'
                         value_format = '{:<8}'
                     elif key in ['N_lect', 'Fcteur']:
-                        value -= 1
+                        value -= step
                         if value < 0: value = 0
                         value_format = '{:<5}'
                     elif key in ['V_max']:
-                        value -= 0.1
+                        value -= 0.1 * step
                         if value < 0: value = 0
                         value_format = '{:<5.1f}'
                     elif key in ['V0_ref']:
-                        value -= 0.001
+                        value -= 0.001 * step
                         if value < 0: value = 0
                         value_format = '{:<6.3f}'
                         lcd.write_line('{:<8.3f}'.format(value), menu_key.current_line, 11)
-                    
-                elif rotary_sw.select():
-                    Current.update({key: value})
-                    config['Current'] = Current
-                    write_file(filename)
-                    load_file(filename)
-                    
-                    ## update menuitems
-                    menu_key.update(sorted(Current))
-                    menu_values.update([Current[k] for k in sorted(Current)])
-                    is_value_modified = not is_value_modified
-                    utime.sleep_ms(300)
                 
                 elapsed = utime.ticks_diff(utime.ticks_ms(), start_time)
                 if elapsed > 200:
                     lcd.write_line(value_format.format(value), menu_key.current_line, 11)
                     start_time = utime.ticks_ms()
-                utime.sleep_ms(delay_ms)
+                await asyncio.sleep_ms(delay_ms)
+            rotary_sw.set_curve()
                     
             lcd.write_line('>> {:<6}: {:<8}'.format(key.upper(), value), menu_key.current_line, 1)                                           
+            if event == LONG_PRESS:
+                break
             
-        elif sw_value == 1 or readPin('Up'):
-            if readPin('Up'): delay_ms = 200
+        elif sw_value == 1 or btn_up.step():
             lcd.clear()
             line = 1
             for k, v in zip(menu_key.next(), menu_values.next()):
@@ -579,8 +747,7 @@ def Config_Current():
                 else:
                     lcd.write_line('{:<6}: {:<8}'.format(k.upper(), v), line, 3)
                 line += 1
-        elif sw_value == -1 or readPin('Down'):
-            if readPin('Down'): delay_ms = 200
+        elif sw_value == -1 or btn_down.step():
             lcd.clear()
             line = 1
             for k, v in zip(menu_key.previous(), menu_values.previous()):
@@ -592,12 +759,9 @@ def Config_Current():
                     lcd.write_line('{:<6}: {:<8}'.format(k.upper(), v), line, 3)
                 line += 1
         
-        utime.sleep_ms(delay_ms)
-    
-    # go back to Configuration menu
-    Configuration()
+        await asyncio.sleep_ms(delay_ms)
 
-def Config_Temp():
+async def Config_Temp():
     """Configuration for temperature."""
     global Temp, config
     is_value_modified = False
@@ -606,10 +770,10 @@ def Config_Temp():
     menu_values = Menu([ Temp[k] for k in sorted(Temp) ], I2C_NUM_ROWS)
     
     first_time = True
-    first_select = True
     
-    while not stop_request:
+    while not stop_request.is_set():
         sw_value = rotary_sw.value()
+        event = select_sw.event()
         delay_ms = 10
         if first_time:
             lcd.clear()
@@ -622,79 +786,78 @@ def Config_Temp():
                 line += 1
             first_time = False
             
-        elif rotary_sw.select():
+        if event == LONG_PRESS:       # back to the main menu
+            break
+        elif event == CLICK:
             ### If the switch is clicked, go into change value mode
             
             value = menu_values.items[menu_key.current_line + menu_key.shift - 1]
             key = menu_key.items[menu_key.current_line + menu_key.shift - 1]
             
-            if not first_select:
-                is_value_modified = not is_value_modified
-                lcd.write_line('{:<6}:>> {:<8}'.format(key.upper(), value), menu_key.current_line, 1)
-            else:
-                first_select = False
+            is_value_modified = not is_value_modified
+            lcd.write_line('{:<6}:>> {:<8}'.format(key.upper(), value), menu_key.current_line, 1)
 
-            utime.sleep_ms(250)
             value_format = ''
             start_time = utime.ticks_ms()
-            while is_value_modified and not stop_request:
-                sw_value = rotary_sw.value()
+            rotary_sw.set_curve(ACCEL_CURVES.get(key))
+            while is_value_modified and not stop_request.is_set():
+                sw_value = rotary_sw.delta()    # detents, accelerated
+                step = max(abs(sw_value), 1)   # an Up/Down press counts 1
+                event = select_sw.event()
                 delay_ms = 10
-                if sw_value == 1 or readPin('Up'):         # turn clockwise
-                    if readPin('Up'): delay_ms = 200
+                if event == CLICK or event == LONG_PRESS:     # long press saves and leaves
+                    Temp.update({key: value})
+                    config['Temp'] = Temp
+                    write_file(filename)
+                    load_file(filename)
+                    
+                    ## update menuitems
+                    menu_key.update(sorted(Temp))
+                    menu_values.update([Temp[k] for k in sorted(Temp)])
+                    is_value_modified = not is_value_modified
+                elif sw_value > 0 or btn_up.step():         # turn clockwise
                     if key in ['Statut']:
                         value = 'Active' if value == 'Inactiv' else 'Inactiv'
                         value_format = '{:<8}'
                     elif key in ['Fcteur']:
-                        value += 1
+                        value += step
                         value_format = '{:<5}'
                     elif key in ['V_max']:
-                        value += 0.1
+                        value += 0.1 * step
                         value_format = '{:<5.1f}'
                     elif key in ['V0_ref']:
-                        value += 0.001
+                        value += 0.001 * step
                         value_format = '{:<6.3f}'
 
-                elif sw_value == -1 or readPin('Down'):
-                    if readPin('Down'): delay_ms = 200
+                elif sw_value < 0 or btn_down.step():
                     if key in ['Statut']:
                         value = 'Active' if value == 'Inactiv' else 'Inactiv'
                         value_format = '{:<8}'
                     elif key in ['Fcteur']:
-                        value -= 1
+                        value -= step
                         if value <= 0: value = 0
                         value_format = '{:<5}'
                     elif key in ['V_max']:
-                        value -= 0.1
+                        value -= 0.1 * step
                         if value <= 0.1: value = 0
                         value_format = '{:<5.1f}'
                     elif key in ['V0_ref']:
-                        value -= 0.001
+                        value -= 0.001 * step
                         if value <= 0.001: value = 0
                         value_format = '{:<6.3f}'
                     
-                elif rotary_sw.select():
-                    Temp.update({key: value})
-                    config['Temp'] = Temp
-                    write_file(filename)
-                    load_file(filename)
-                    
-                    ## update menuitems
-                    menu_key.update(sorted(Temp))
-                    menu_values.update([Temp[k] for k in sorted(Temp)])
-                    is_value_modified = not is_value_modified
-                    utime.sleep_ms(300)
-                    
                 elapsed = utime.ticks_diff(utime.ticks_ms(), start_time)
                 if elapsed > 200:
                     lcd.write_line(value_format.format(value), menu_key.current_line, 11)
                     start_time = utime.ticks_ms()
-                utime.sleep_ms(delay_ms)
+                await asyncio.sleep_ms(delay_ms)
+            rotary_sw.set_curve()
           
             lcd.write_line('>> {:<6}: {:<8}'.format(key.upper(), value), menu_key.current_line, 1)                                           
+            if event == LONG_PRESS:
+                break
             
-        elif sw_value == 1 or readPin('Up'):
-            if readPin('Up'): delay_ms = 200
+        elif sw_value == 1 or btn_up.step():
             lcd.clear()
             line = 1
             for k, v in zip(menu_key.next(), menu_values.next()):
@@ -703,8 +866,7 @@ def Config_Temp():
                 else:
                     lcd.write_line('{:<6}: {:<8}'.format(k.upper(), v), line, 3)
                 line += 1
-        elif sw_value == -1 or readPin('Down'):
-            if readPin('Down'): delay_ms = 200
+        elif sw_value == -1 or btn_down.step():
             lcd.clear()
             line = 1
             for k, v in zip(menu_key.previous(), menu_values.previous()):
@@ -716,13 +878,10 @@ def Config_Temp():
                     lcd.write_line('{:<6}: {:<8}'.format(k.upper(), v), line, 3)
                 line += 1
         
-        utime.sleep_ms(delay_ms)
-    
-    # go back to Configuration menu
-    Configuration()
+        await asyncio.sleep_ms(delay_ms)
 
     
-def Config_Parametres():
+async def Config_Parametres():
     """"Configuration for LCD"""
     global Parametres, config
     is_value_modified = False
@@ -731,9 +890,9 @@ def Config_Parametres():
     menu_values = Menu([Parametres[k] for k in sorted(Parametres)], I2C_NUM_ROWS)
     
     first_time = True
-    first_select = True
-    while not stop_request:
+    while not stop_request.is_set():
         sw_value = rotary_sw.value()
+        event = select_sw.event()
         delay_ms = 1
         if first_time:
             lcd.clear()
@@ -746,26 +905,36 @@ def Config_Parametres():
                 line += 1
             first_time = False
             
-        elif rotary_sw.select():
+        if event == LONG_PRESS:       # back to the main menu
+            break
+        elif event == CLICK:
             ### If the switch is clicked, go into change value mode
             
             value = menu_values.items[menu_key.current_line + menu_key.shift - 1]
             key = menu_key.items[menu_key.current_line + menu_key.shift - 1]
             
-            if not first_select:
-                is_value_modified = not is_value_modified
-                lcd.write_line('{:<8}:>> {:<8}'.format(key.upper(), value), menu_key.current_line, 1)
-            else:
-                first_select = False
+            is_value_modified = not is_value_modified
+            lcd.write_line('{:<8}:>> {:<8}'.format(key.upper(), value), menu_key.current_line, 1)
                 
-            utime.sleep_ms(250)
             value_format = '{:<8}'
             start_time = utime.ticks_ms()
-            while is_value_modified and not stop_request:
-                sw_value = rotary_sw.value()
+            rotary_sw.set_curve(ACCEL_CURVES.get(key))
+            while is_value_modified and not stop_request.is_set():
+                sw_value = rotary_sw.delta()    # detents, accelerated
+                step = max(abs(sw_value), 1)   # an Up/Down press counts 1
+                event = select_sw.event()
                 delay_ms = 1
-                if sw_value == 1 or readPin('Up'):         # turn clockwise
-                    if readPin('Up'): delay_ms = 200
+                if event == CLICK or event == LONG_PRESS:     # long press saves and leaves
+                    Parametres.update({key: value})
+                    config['Parametres'] = Parametres
+                    write_file(filename)
+                    load_file(filename)
+                    
+                    ## update menuitems
+                    menu_key.update(sorted(Parametres))
+                    menu_values.update([ Parametres[k] for k in sorted(Parametres) ])
+                    is_value_modified = not is_value_modified
+                elif sw_value > 0 or btn_up.step():         # turn clockwise
                     if key == 'LCD_li':
                         value = 2 if value == 4 else 4
                     elif key == 'LCD_co':
@@ -782,10 +951,9 @@ def Config_Parametres():
                     elif key == 'MdStpPin':
                         value = 'OPEN' if value == 'COUNTER' else 'COUNTER'
                     else:
-                        value += 1
+                        value += step
                         
-                elif sw_value == -1 or readPin('Down'):
-                    if readPin('Down'): delay_ms = 200
+                elif sw_value < 0 or btn_down.step():
                     if key == 'LCD_li':
                         value = 2 if value == 4 else 4
                     elif key == 'LCD_co':
@@ -802,31 +970,21 @@ def Config_Parametres():
                     elif key == 'MdStpPin':
                         value = 'OPEN' if value == 'COUNTER' else 'COUNTER'
                     else:
-                        value -= 1
+                        value -= step
                         if value <= 1: value = 1
-                        
-                elif rotary_sw.select():
-                    Parametres.update({key: value})
-                    config['Parametres'] = Parametres
-                    write_file(filename)
-                    load_file(filename)
-                    
-                    ## update menuitems
-                    menu_key.update(sorted(Parametres))
-                    menu_values.update([ Parametres[k] for k in sorted(Parametres) ])
-                    is_value_modified = not is_value_modified
-                    utime.sleep_ms(300)
                 
                 elapsed = utime.ticks_diff(utime.ticks_ms(), start_time)
                 if elapsed > 200:
                     lcd.write_line(value_format.format(value), menu_key.current_line, 13)
                     start_time = utime.ticks_ms()
-                utime.sleep_ms(delay_ms)
+                await asyncio.sleep_ms(delay_ms)
+            rotary_sw.set_curve()
                 
             lcd.write_line('>> {:<8}: {:<8}'.format(key.upper(), value), menu_key.current_line, 1)                                   
+            if event == LONG_PRESS:
+                break
             
-        elif sw_value == 1 or readPin('Up'):
-            if readPin('Up'): delay_ms = 200
+        elif sw_value == 1 or btn_up.step():
             lcd.clear()
             line = 1
             for k, v in zip(menu_key.next(), menu_values.next()):
@@ -835,8 +993,7 @@ def Config_Parametres():
                 else:
                     lcd.write_line('{:<8}: {:<8}'.format(k.upper(), v), line, 3)
                 line += 1
-        elif sw_value == -1 or readPin('Down'):
-            if readPin('Down'): delay_ms = 200
+        elif sw_value == -1 or btn_down.step():
             lcd.clear()
             line = 1
             for k, v in zip(menu_key.previous(), menu_values.previous()):
@@ -848,26 +1005,88 @@ def Config_Parametres():
                     lcd.write_line('{:<8}: {:<8}'.format(k.upper(), v), line, 3)
                 line += 1
         
-        utime.sleep_ms(delay_ms)
+        await asyncio.sleep_ms(delay_ms)
+    
     
-    # go back to Configuration menu
-    Configuration()
+def diagnostics_pages():
+    """Pages of the diagnostics screen, a list of lines for each"""
+    pages = []
+    for name in sorted(latency.series):
+        (n, react50, react95, react_max), (_, puls50, puls95, puls_max) = latency.summary(name)
+        pages.append([
+            '{:<15}n{:>4}'.format(name.upper(), n),
+            'ms    P50  P95  MAX',
+            'REACT{:>5}{:>5}{:>5}'.format(react50, react95, react_max),
+            'IMPUL{:>5}{:>5}{:>5}'.format(puls50, puls95, puls_max)])
+    if not pages:
+        pages.append(['AUCUNE MESURE'])
+    lines = []
+    for name in inputs.names:
+        stats = learner.stats(name)
+        lines.append('{:<9}{:>3}ms CH{:>3}'.format(name.upper(), stats['window_ms'], stats['chatter']))
+    for i in range(0, len(lines), I2C_NUM_ROWS - 1):
+        pages.append(['ANTIREBOND'] + lines[i:i + I2C_NUM_ROWS - 1])
+    return pages
+
+def dump_diagnostics():
+    """Print latency and debounce statistics on the serial console"""
+    latency.dump()
+    print('debounce  window learned bursts bounced chatter')
+    for name in inputs.names:
+        stats = learner.stats(name)
+        print('{:<10}{:>6}{:>8}{:>7}{:>8}{:>8}'.format(
+            name, stats['window_ms'], 'yes' if stats['learned'] else 'no',
+            stats['bursts'], stats['bounced'], stats['chatter']))
+
+async def Diagnostics():
+    """Show the diagnostics pages, select dumps them on serial"""
+    page = 0
+    first_time = True
+    start_time = utime.ticks_ms()
+    dump_diagnostics()
+    
+    while not stop_request.is_set():
+        sw_value = rotary_sw.value()
+        event = select_sw.event()
+        delay_ms = 1
+        if event == LONG_PRESS:       # back to the main menu
+            break
+        elif event == CLICK:
+            dump_diagnostics()
+        elif sw_value == 1 or btn_up.step():
+            page += 1
+            first_time = True
+        elif sw_value == -1 or btn_down.step():
+            page -= 1
+            first_time = True
+        
+        # redraw on page change, and every second for new measures
+        if first_time or utime.ticks_diff(utime.ticks_ms(), start_time) > 1000:
+            pages = diagnostics_pages()
+            page %= len(pages)
+            if first_time:
+                lcd.clear()
+            for line, text in enumerate(pages[page], 1):
+                lcd.write_line(text, line)
+            first_time = False
+            start_time = utime.ticks_ms()
+        
+        await asyncio.sleep_ms(delay_ms)
     
     
 ### menu
-menu = Menu(["Minuterie", "Courant", "Temperature", "Parametres"], I2C_NUM_ROWS)
-menu_fct = [Config_Timers, Config_Current, Config_Temp, Config_Parametres]
+menu = Menu(["Minuterie", "Courant", "Temperature", "Parametres", "Diagnostic"], I2C_NUM_ROWS)
+menu_fct = [Config_Timers, Config_Current, Config_Temp, Config_Parametres, Diagnostics]
 
 
-def Configuration():
+async def Configuration():
     """Configuration main menu."""
-    global in_prog_mode, stop_request
-    
-    stop_request = False
     first_time = True
+    rotary_sw.reset()       # forget the turns made outside the menus
     
-    while not stop_request:
+    while not stop_request.is_set():
         sw_value = rotary_sw.value()
+        event = select_sw.event()
         delay_ms = 1
         if first_time:
             line = 1
@@ -879,10 +1098,13 @@ def Configuration():
                     lcd.write_line(item.upper(), line, 5)
                 line += 1
             first_time = False
-            utime.sleep_ms(500)
             
-        elif sw_value == 1 or readPin('Up'):    # turn clockwise
-            delay_ms = 1 if sw_value == 1 else 200
+        if event == CLICK:
+            await menu_fct[menu.current_line + menu.shift - 1]()
+            first_time = True       # back from the submenu, redraw
+        elif event == LONG_PRESS:       # leave the configuration
+            break
+        elif sw_value == 1 or btn_up.step():    # turn clockwise
             line = 1
             lcd.clear()
             for item in menu.next():
@@ -891,8 +1113,7 @@ def Configuration():
                 else:
                     lcd.write_line(item.upper(), line, 5)
                 line += 1
-        elif sw_value == -1 or readPin('Down'):    # turn counter-clockwise
-            delay_ms = 1 if sw_value == 1 else 200
+        elif sw_value == -1 or btn_down.step():    # turn counter-clockwise
             line = 1
             lcd.clear()
             for item in menu.previous():
@@ -901,37 +1122,67 @@ def Configuration():
                 else:
                     lcd.write_line(item.upper(), line, 5)
                 line += 1
-                
-        elif rotary_sw.select():
-            menu_fct[menu.current_line + menu.shift - 1]()
             
-        utime.sleep_ms(delay_ms)
+        await asyncio.sleep_ms(delay_ms)
 
-        
-def main():
-    """Main program, call others functions"""
-    #global state
-    global stop_request
-    global is_running
+async def ui_task():
+    """Enter the configuration on a click while the door is idle"""
     global in_prog_mode
     
-    initialize()
-    
-    #_thread.start_new_thread(stop_signal_handler, ())
+    while True:
+        if not is_running and not stop_token_first and not stop_request.is_set():
+            if select_sw.event() == CLICK:
+                in_prog_mode = True
+                await Configuration()
+                stop_request.set()      # initialize again, as after a stop
+        await asyncio.sleep_ms(UI_POLL_MS)
+
+async def run():
+    """Start every task, initialize again after each stop request"""
+    await initialize()
+    asyncio.create_task(door_task())
+    asyncio.create_task(stop_task())
+    asyncio.create_task(input_task())
+    asyncio.create_task(current_task())
+    asyncio.create_task(temp_task())
+    asyncio.create_task(ui_task())
     
     while True:
-        if not is_running:
-            if (readPin('Close') or readPin('Open')) and not stop_token_first:
-                Logic_loop()
-            elif rotary_sw.select() and not stop_token_first:
-                Configuration()
-        if stop_request:
-            initialize()
-        
-        utime.sleep_ms(10)            
+        await stop_request.wait()
+        cancel_door_tasks()
+        await initialize()
+
+def main():
+    """Main program, call others functions"""
+    try:
+        asyncio.run(run())
+    finally:
+        asyncio.new_event_loop()    # clear the tasks left by a soft reset
+
+# capture every input edge, and listen to Stop interrupt
+# a limit edge is timed from the first edge after DEBOUNCE_MAX_MS of quiet
+inputs = EdgeInputs(Input, Parametres['btn_lect'] * delay_readPin, 128,
+                    DEBOUNCE_MAX_MS)
+inputs.on_rise('Stop', stop_signal_handler)
+
+# debounce all inputs in the background, from one GPIO_IN snapshot per msec;
+# on a hard Timer rather than a task, the scheduler can't keep a 1 msec pace.
+# The encoder clk/dt pins are left out: Rotary decodes them in their own pin
+# IRQs, whose transition table already rejects bounces, and a 1 msec
+# snapshot would miss quadrature edges that come faster than that.
+debouncer = Debouncer(inPin, Parametres['btn_lect'] * delay_readPin)
+debounce_timer.init(period=1, mode=Timer.PERIODIC, callback=debouncer.tick, hard=True)
+
+# learn how long each input bounces and shorten/lengthen its window to match,
+# polled by input_task
+learner = BounceLearner(inputs, debouncer, DEBOUNCE_MIN_MS, DEBOUNCE_MAX_MS)
+
+# Up/Down repeat while held, from 300 msec down to 20 msec between steps
+btn_up = RepeatButton(debouncer, 'Up')
+btn_down = RepeatButton(debouncer, 'Down')
 
-# listen to Stop interrupt
-Input['Stop'].irq(trigger=Pin.IRQ_RISING, handler=stop_signal_handler)
+# encoder switch clicks, reported on release; long press saves and leaves
+select_sw = SelectSwitch(rotary_sw.sw_pin(), double_ms=0)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,10 @@
+# Host test setup: the firmware modules live in lib/ and need the
+# MicroPython stand-ins of lib/host.py under CPython.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib'))
+
+import host
+host.install()
@@ -0,0 +1,121 @@
+# The door cycle of main.py under asyncio, on the host stand-ins: the inputs
+# are driven on the Pins and the outputs logged, the 1 msec debounce timer
+# and the LCD frames are fired by a task.
+
+import asyncio
+import importlib
+import os
+import sys
+
+import pytest
+
+import host
+import machine
+from lcd_emu import Pcf8574Hd44780
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SIO_GPIO_IN = 0xd0000004
+TIMEOUT_S = 5
+
+
+@pytest.fixture
+def firmware(tmp_path, monkeypatch):
+    # main.py writes its configuration in the current directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(ROOT)
+    sys.path.remove(ROOT)
+    sys.path.insert(1, ROOT)            # after lib/, as on the Pico
+    bus = Pcf8574Hd44780(4, 20)
+    monkeypatch.setattr(machine, 'I2C', lambda *args, **kwargs: bus, raising=False)
+    sys.modules.pop('main', None)
+    main = importlib.import_module('main')
+    main.Timers.update({'Cls': 0, 'Opn1': 0, 'Mid': 0, 'Opn2': 0})
+    main.Parametres.update({'MidStop': 99, 'btn_dura': 50})
+    main.log = []
+    for name, pin in main.Output.items():
+        monkeypatch.setattr(pin, 'value', logged(main.log, name, pin))
+    yield main
+    sys.modules.pop('main', None)
+
+
+def logged(log, name, pin):
+    # Pin.value that records the changes of an output
+    value = type(pin).value
+
+    def wrapper(v=None):
+        if v is not None and (1 if v else 0) != pin.level:
+            log.append((name, 1 if v else 0))
+        return value(pin, v)
+    return wrapper
+
+
+async def ticks(main):
+    # The hard Timers of the Pico: debounce every msec, LCD frames
+    while True:
+        level = 0
+        for name, pin in main.Input.items():
+            if pin.level:
+                level |= 1 << main.inPin[name]
+        machine.mem32[SIO_GPIO_IN] = level
+        main.debounce_timer.fire()
+        main.lcd.timer.fire()
+        host.clock.advance_us(1000)
+        await asyncio.sleep(0.001)
+
+
+async def wait_for(condition):
+    for _ in range(TIMEOUT_S * 1000):
+        if condition():
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError('timed out')
+
+
+async def hold(main, name, secs=0.03):
+    main.Input[name].drive(1)
+    await asyncio.sleep(secs)
+    main.Input[name].drive(0)
+
+
+def pulses(main):
+    """The Open and Close pulses logged, in order."""
+    return [name for name, level in main.log
+            if level and name in ('Open', 'Close')]
+
+
+def test_stop_during_pulse_then_full_cycle(firmware):
+    main = firmware
+
+    async def scenario():
+        tasks = [asyncio.create_task(ticks(main)),
+                 asyncio.create_task(main.run())]
+        await wait_for(lambda: main.run_screen is not None
+                       and not main.stop_request.is_set())
+        # Close, and Stop while its relay is on
+        main.Input['Close'].drive(1)
+        await wait_for(lambda: main.Output['Close'].level)
+        main.Input['Stop'].drive(1)
+        await wait_for(lambda: not main.Output['Close'].level)
+        main.Input['Close'].drive(0)
+        await asyncio.sleep(0.03)
+        main.Input['Stop'].drive(0)
+        await wait_for(lambda: not main.stop_token_first)
+        await wait_for(lambda: not main.stop_request.is_set())
+        del main.log[:]
+
+        # A whole cycle: every relay pulses again
+        await hold(main, 'Close')
+        await wait_for(lambda: main.door.state == main.ST_CLOSED
+                       and not main.Output['Close'].level)
+        await hold(main, 'CloseLmt')
+        await wait_for(lambda: pulses(main) == ['Close', 'Open'])
+        await wait_for(lambda: not main.Output['Open'].level)
+        await hold(main, 'OpenLmt')
+        await wait_for(lambda: pulses(main) == ['Close', 'Open', 'Close'])
+        await wait_for(lambda: not main.Output['Close'].level)
+        assert main.door.state == main.ST_CLOSED
+        assert main.Output['Counter'].level == 0
+        for task in tasks:
+            task.cancel()
+
+    asyncio.run(scenario())
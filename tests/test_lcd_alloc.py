@@ -0,0 +1,56 @@
+# Steady-state LCD output must not allocate: 1000 write_line calls against
+# a stand-in bus leave the free heap where it was.
+
+import gc
+
+from lcd_emu import Pcf8574Hd44780
+from pico_i2c_lcd import I2cLcd
+
+CALLS = 1000
+
+try:
+    mem_free = gc.mem_free              # MicroPython
+except AttributeError:
+    # CPython: count the blocks held by the code of lib/ only, the test
+    # runner allocates on its own
+    import os
+    import tracemalloc
+
+    LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib')
+
+    def mem_free():
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(True, os.path.normpath(LIB) + os.sep + '*'),))
+        return -sum(stat.size for stat in snapshot.statistics('filename'))
+
+
+def test_write_line_allocates_nothing():
+    bus = Pcf8574Hd44780(4, 20)
+    lcd = I2cLcd(bus, 0x27, 4, 20)
+    # Two full lines that differ in every cell, so every call sends 20 data
+    # bytes; built before measuring so that only the driver is measured.
+    texts = ('A' * 20, 'B' * 20)
+    tracing = not hasattr(gc, 'mem_free')
+    if tracing:
+        tracemalloc.start()
+    try:
+        # A first round brings the counters and the emulator state to their
+        # steady size: on CPython ints above 256 are heap objects.
+        for i in range(CALLS):
+            lcd.write_line(texts[i & 1], 1)
+        tx_bytes = lcd.tx_bytes
+        tx_count = lcd.tx_count
+        gc.collect()
+        before = mem_free()
+        for i in range(CALLS):
+            lcd.write_line(texts[i & 1], 1)
+        after = mem_free()
+    finally:
+        if tracing:
+            tracemalloc.stop()
+    assert after >= before
+    # Each call is one transfer: a DDRAM address and 20 characters, at
+    # 4 PCF8574 bytes per LCD byte.
+    assert lcd.tx_count - tx_count == CALLS
+    assert lcd.tx_bytes - tx_bytes == CALLS * 21 * 4
+    assert bus.lines()[0] == texts[(CALLS - 1) & 1]
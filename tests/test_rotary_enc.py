@@ -0,0 +1,84 @@
+# Rotary decoding and acceleration, driven by synthetic quadrature edges on
+# the host Pin stand-ins, in virtual time.
+
+from host import clock, quadrature
+from rotary_enc import Rotary
+
+# (detent interval ms, multiplier), as main.ACCEL_FAST
+CURVE = ((30, 100), (80, 10))
+
+
+def make(half_step=False, curve=CURVE):
+    rotary = Rotary(sw_pin=9, clk_pin=15, dt_pin=16, half_step=half_step,
+                    irq=True)
+    # Encoders rest with both signals high
+    rotary._clk_pin.drive(1)
+    rotary._dt_pin.drive(1)
+    rotary.set_curve(curve)
+    clock.advance_us(1000000)     # the first detent is never a fast one
+    return rotary
+
+
+def turn(rotary, steps, detent_ms):
+    quadrature(rotary._clk_pin, rotary._dt_pin, steps, detent_ms * 250)
+
+
+def test_slow_turn_counts_single_steps():
+    rotary = make()
+    turn(rotary, 3, 100)
+    assert rotary.delta() == 3
+    turn(rotary, -3, 100)
+    assert rotary.delta() == -3
+
+
+def test_medium_turn_counts_tens():
+    rotary = make()
+    turn(rotary, 3, 50)
+    assert rotary.delta() == 1 + 2 * 10
+
+
+def test_fast_turn_counts_hundreds():
+    rotary = make()
+    turn(rotary, -5, 20)
+    assert rotary.delta() == -(1 + 4 * 100)
+
+
+def test_steps_are_not_accelerated():
+    rotary = make()
+    turn(rotary, 5, 20)
+    assert rotary.steps() == 5
+    assert rotary.delta() == 0      # read together with the steps
+
+
+def test_no_curve():
+    rotary = make(curve=None)
+    turn(rotary, 5, 20)
+    assert rotary.delta() == 5
+
+
+def test_value_pops_one_detent():
+    rotary = make()
+    turn(rotary, 2, 20)
+    assert rotary.value() == 1
+    assert rotary.value() == 1
+    assert rotary.value() == 0
+
+
+def test_half_step_counts_two_per_detent():
+    # The half step table counts the other way round than the full step
+    # one; only the count per detent and the sign change are checked.
+    rotary = make(half_step=True, curve=None)
+    turn(rotary, 3, 100)
+    forward = rotary.steps()
+    turn(rotary, -3, 100)
+    assert abs(forward) == 6
+    assert rotary.steps() == -forward
+
+
+def test_partial_detent_counts_nothing():
+    rotary = make()
+    rotary._dt_pin.drive(0)         # first half of a clockwise detent
+    rotary._clk_pin.drive(0)
+    rotary._clk_pin.drive(1)        # and back: contact bounce
+    rotary._dt_pin.drive(1)
+    assert rotary.steps() == 0